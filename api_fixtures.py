@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+# Query parameters holding credentials, never written to a fixture
+SECRET_PARAMS = ("apikey", "token")
+
+_record_dir = None
+_record_lock = threading.Lock()
+
+
+def fixture_name(provider, url):
+    """Fixture file of a request: <provider>/<endpoint>[_<symbol>].json.
+
+    Only the endpoint (last path segment) and the symbol identify a response, so fixtures recorded
+    on one day replay for requests made with other dates.
+    """
+    parts = urlsplit(url)
+    endpoint = parts.path.rstrip("/").rsplit("/", 1)[-1] or "index"
+    symbol = parse_qs(parts.query).get("symbol", [None])[0]
+    name = f"{endpoint}_{symbol}" if symbol else endpoint
+    return os.path.join(provider, f"{name}.json")
+
+
+def redact_url(url):
+    parts = urlsplit(url)
+    query = "&".join(param for param in parts.query.split("&") if param.split("=", 1)[0] not in SECRET_PARAMS)
+    return parts._replace(query=query).geturl()
+
+
+def configure_recording(system_config):
+    """Record API responses to the directory in the optional "record_fixtures" system config setting."""
+    global _record_dir
+    _record_dir = system_config.get("record_fixtures") if system_config else None
+
+
+def record_response(provider, url, status, content):
+    """Save a response as a fixture when recording is on. content is the raw body."""
+    if _record_dir is None or provider is None:
+        return
+    path = os.path.join(_record_dir, fixture_name(provider, url))
+    try:
+        body = json.loads(content) if content and content.strip() else None
+    except ValueError:
+        body = content.decode("utf-8", "replace")
+    with _record_lock:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump({"url": redact_url(url), "status": status, "body": body}, f)
+        except (IOError, OSError) as e:
+            logging.error(f"Error: Unable to record fixture {path}: {e}")
+
+
+def load_fixture(fixtures_dir, provider, url):
+    """(status, body) recorded for the request, or None if there is no fixture for it."""
+    path = os.path.join(fixtures_dir, fixture_name(provider, url))
+    try:
+        with open(path, "r") as f:
+            fixture = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (IOError, ValueError) as e:
+        logging.error(f"Error: Unable to read fixture {path}: {e}")
+        return None
+    return fixture["status"], fixture["body"]
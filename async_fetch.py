@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import api_fixtures
+import earnings_cache
+import http_client
+import metrics
+import rate_limiter
+from chain_parser import parse_chain
+from data_fetch import chain_endpoint, earnings_endpoint, is_valid_chain, parse_earnings_dates, make_chain, \
+    handle_api_error, chain_key, with_line_number, get_http_client
+from single_flight import get_single_flight
+
+# Upper bound of simultaneous connections to each API host
+HOST_CONCURRENCY = 20
+
+
+async def get_json(session, url, provider, parse=None):
+    """GET a JSON document, applying the same rate limits and retry policy as the threaded client.
+
+    With parse given, the raw body is passed to it instead of being decoded as JSON.
+    """
+    limiter = rate_limiter.get_limiter(provider)
+    # Per-host counters go to the threaded client's, so both backends report their hosts alike
+    stats = get_http_client()
+    host = urlsplit(url).hostname
+    attempt = 0
+    while True:
+        if limiter is not None:
+            waited = await limiter.acquire_async()
+            metrics.count("throttle_secs", waited)
+            stats.record_stats(host, throttle_secs=waited)
+        metrics.count("http_requests")
+        stats.record_stats(host, requests=1)
+        try:
+            async with session.get(url) as response:
+                status = response.status
+                if status not in http_client.RETRY_STATUS_CODES or attempt >= http_client.MAX_RETRIES:
+                    content = await response.read()
+                    api_fixtures.record_response(provider, url, status, content)
+                    if status != 200:
+                        return status, None
+                    try:
+                        if parse is not None:
+                            with metrics.span("parse"):
+                                return status, parse(content)
+                        # None for an empty body, like Finnhub sends for unknown symbols
+                        return status, json.loads(content) if content.strip() else None
+                    except ValueError as e:
+                        logging.error(f"Error decoding API response: {e}")
+                        return status, None
+                retry_after = http_client.parse_retry_after(response.headers.get("Retry-After"))
+                if status == 429:
+                    metrics.count("http_429")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt >= http_client.MAX_RETRIES:
+                raise
+            logging.warning(f"Request to {url.split('?')[0]} failed ({e}). Retrying")
+            retry_after = None
+
+        delay = http_client.compute_backoff(attempt, retry_after)
+        logging.warning(f"Retrying {url.split('?')[0]} in {delay:.1f} seconds")
+        metrics.count("http_retries")
+        metrics.count("backoff_secs", delay)
+        stats.record_stats(host, retries=1, wait_secs=delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def remember_host(session, context, params):
+    context.host = params.url.host
+
+
+async def count_new_connection(session, context, params):
+    # Requests that reuse a pooled connection never get here, which gives the reuse ratio
+    get_http_client().record_stats(context.host, new_connections=1)
+
+
+async def fetch_chain_for_ticker_async(session, api_key, ticker, line_number, from_date, to_date, finnhub_api_key):
+    """Shares the result of an identical fetch in flight on any thread or loop, see single_flight."""
+    chain = await get_single_flight().call_async(
+        chain_key(ticker, from_date, to_date),
+        lambda: request_chain_for_ticker_async(session, api_key, ticker, line_number, from_date, to_date,
+                                               finnhub_api_key))
+    return with_line_number(chain, line_number)
+
+
+async def request_chain_for_ticker_async(session, api_key, ticker, line_number, from_date, to_date,
+                                         finnhub_api_key):
+    earnings_data_retrieved = False
+    earnings_dates = []
+
+    try:
+        with metrics.span("chain", ticker):
+            status, parsed = await get_json(session, chain_endpoint(api_key, ticker, from_date, to_date),
+                                            "tdameritrade", parse=parse_chain)
+        if status not in (200, 429):
+            logging.error(f"Error fetching data from API. Status code: {status}")
+        summary, table = parsed or (None, None)
+
+        if not is_valid_chain(summary):
+            handle_api_error(ticker)
+            return None
+
+        if len(table):
+            cache = earnings_cache.get_cache()
+            earnings_from = datetime.now()
+            cached_dates = cache.get(ticker, earnings_from, to_date)
+            if cached_dates is not None:
+                earnings_dates = cached_dates
+                earnings_data_retrieved = True
+            else:
+                with metrics.span("earnings", ticker):
+                    status, earnings_data = await get_json(session, earnings_endpoint(ticker, to_date,
+                                                                                      finnhub_api_key), "finnhub")
+                if status == 200 and earnings_data is not None:
+                    earnings_dates = parse_earnings_dates(earnings_data)
+                    cache.put(ticker, earnings_from, to_date, earnings_dates)
+                    earnings_data_retrieved = True
+                else:
+                    logging.error(f"Error: Unable to fetch earnings data for {ticker}. HTTP status code: {status}")
+
+        return make_chain(ticker, line_number, summary, table, from_date, to_date, earnings_dates,
+                          earnings_data_retrieved)
+
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        handle_api_error(ticker)
+        logging.exception("There was an exception when making an API request.")
+        return None
+
+
+async def cancel_when_set(cancel_event, tasks, poll_secs=0.2):
+    # threading.Event cannot be awaited, so poll it and cancel whatever is still pending
+    while not cancel_event.is_set():
+        await asyncio.sleep(poll_secs)
+    for task in tasks:
+        task.cancel()
+
+
+async def fetch_chains_async(api_key, tickers, from_date, to_date, finnhub_api_key, progress_callback=None,
+                             cancel_event=None, chain_callback=None):
+    """Asyncio counterpart of data_fetch.fetch_chains returning the same {ticker: chain} mapping."""
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=HOST_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=http_client.REQUEST_TIMEOUT_SECS)
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(remember_host)
+    trace_config.on_connection_create_end.append(count_new_connection)
+    chains = {}
+    done = 0
+
+    async def fetch_one(session, ticker, line_number):
+        nonlocal done
+        chain = None
+        try:
+            chain = await fetch_chain_for_ticker_async(session, api_key, ticker, line_number, from_date, to_date,
+                                                       finnhub_api_key)
+        except Exception as e:
+            logging.error(f"Error: Unable to fetch options for {ticker}: {e}")
+        if chain is not None:
+            chains[ticker] = chain
+        done += 1
+        if chain_callback is not None:
+            chain_callback(ticker, chain)
+        if progress_callback is not None:
+            progress_callback(done, len(tickers))
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace_config]) as session:
+        tasks = [asyncio.ensure_future(fetch_one(session, ticker, line_number)) for ticker, line_number in tickers]
+        watcher = asyncio.ensure_future(cancel_when_set(cancel_event, tasks)) if cancel_event is not None else None
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if watcher is not None:
+            watcher.cancel()
+
+    return chains
@@ -0,0 +1,67 @@
+"""Compare decoding a chain response with parse_chain against json.loads followed by separate walks.
+
+Run from the repository root:  python benchmarks/bench_parse.py
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from chain_parser import parse_chain
+from data_fetch import calculate_put_call_ratio
+from option_table import OptionTable
+from benchmarks.synthetic import synthetic_chain
+
+CASES = [
+    # (strike count, expirations)
+    (20, 4),
+    (50, 8),
+    (100, 12),
+    (200, 26),
+]
+
+
+def two_pass(content):
+    """What fetching a chain did before parse_chain: full decode, then ratio and table walks."""
+    data = json.loads(content)
+    return data, OptionTable.from_chain(data, calculate_put_call_ratio(data))
+
+
+def single_pass(content):
+    return parse_chain(content)
+
+
+def measure(func, content, runs):
+    best = min(timeit.repeat(lambda: func(content), repeat=3, number=runs)) / runs
+    tracemalloc.start()
+    result = func(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main():
+    print(f"{'strikes':>8} {'expiries':>8} {'KiB json':>9} {'two-pass ms':>12} {'one-pass ms':>12} "
+          f"{'two-pass peak KiB':>18} {'one-pass peak KiB':>18}")
+    for strike_count, expirations in CASES:
+        content = json.dumps(synthetic_chain("BENCH", strike_count=strike_count, expirations=expirations)).encode()
+        runs = max(3, 400 // (strike_count * expirations // 40))
+
+        data, table = two_pass(content)
+        summary, parsed_table = single_pass(content)
+        assert summary["put_call_ratio"] == calculate_put_call_ratio(data), "put/call ratio differs"
+        assert [o.symbol for o in table.top_options(0.3, 50000.0, "arr")] == \
+               [o.symbol for o in parsed_table.top_options(0.3, 50000.0, "arr")], "results differ"
+
+        two_time, two_peak = measure(two_pass, content, runs)
+        one_time, one_peak = measure(single_pass, content, runs)
+        print(f"{strike_count:>8} {expirations:>8} {len(content) / 1024:>9.0f} {two_time * 1000:>12.3f} "
+              f"{one_time * 1000:>12.3f} {two_peak / 1024:>18.0f} {one_peak / 1024:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
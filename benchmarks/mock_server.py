@@ -0,0 +1,179 @@
+"""Local stand-in for the TD Ameritrade and Finnhub APIs.
+
+Serves recorded fixtures (see "record_fixtures" in the README) or synthetic chain, market hours
+and earnings responses, with optional latency, HTTP 429s and server errors. Point the app at it
+with the "base_urls" section it prints:
+
+    python benchmarks/mock_server.py --port 8765 --latency-ms 50 --rate-429 0.02
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from api_fixtures import load_fixture
+from benchmarks.synthetic import synthetic_chain, synthetic_tickers
+
+PROVIDERS = ("tdameritrade", "finnhub")
+# The market-wide earnings calendar covers the synthetic tickers benchmarks use
+CALENDAR_TICKERS = 5000
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+
+
+def synthetic_earnings_date(symbol):
+    """Every fifth symbol (by hash) reports within the next 40 days; the same symbol always gets the same day."""
+    digest = zlib.crc32(symbol.encode())
+    if digest % 5:
+        return None
+    return (datetime.now() + timedelta(days=digest % 40)).strftime('%Y-%m-%d')
+
+
+def synthetic_earnings(symbol, from_date, to_date):
+    symbols = [symbol] if symbol else synthetic_tickers(CALENDAR_TICKERS)
+    calendar = []
+    for candidate in symbols:
+        date = synthetic_earnings_date(candidate)
+        if date is not None and from_date <= date <= to_date:
+            calendar.append({"symbol": candidate, "date": date})
+    return {"earningsCalendar": calendar}
+
+
+def synthetic_hours():
+    today = datetime.now(MARKET_TIMEZONE)
+    start = today.replace(hour=9, minute=30, second=0, microsecond=0)
+    end = today.replace(hour=16, minute=0, second=0, microsecond=0)
+    open_today = today.weekday() < 5
+    return {"option": {"EQO": {
+        "isOpen": open_today,
+        "sessionHours": {"regularMarket": [{"start": start.isoformat(), "end": end.isoformat()}]} if open_today else {},
+    }}}
+
+
+class MockApiServer:
+    """Threaded HTTP server answering /tdameritrade/... and /finnhub/... requests."""
+
+    def __init__(self, port=0, fixtures_dir=None, latency_ms=0.0, rate_429=0.0, error_rate=0.0, retry_after=1,
+                 seed=None):
+        self.fixtures_dir = fixtures_dir
+        self.latency_secs = latency_ms / 1000
+        self.rate_429 = rate_429
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_port
+
+    def base_urls(self):
+        return {provider: f"http://127.0.0.1:{self.port}/{provider}" for provider in PROVIDERS}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, path, query):
+        """(status, body, headers) for a request."""
+        provider, _, api_path = path.lstrip("/").partition("/")
+        endpoint = api_path.rstrip("/").rsplit("/", 1)[-1]
+        with self._lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            roll = self.random.random()
+        if self.latency_secs:
+            time.sleep(self.latency_secs)
+        if roll < self.rate_429:
+            return 429, {"error": "rate limited"}, {"Retry-After": str(self.retry_after)}
+        if roll < self.rate_429 + self.error_rate:
+            return 500, {"error": "injected failure"}, {}
+
+        if self.fixtures_dir and provider in PROVIDERS:
+            fixture = load_fixture(self.fixtures_dir, provider, f"{path}?{self._query_string(query)}")
+            if fixture is not None:
+                status, body = fixture
+                return status, body, {}
+
+        symbol = query.get("symbol", [None])[0]
+        if provider == "tdameritrade" and endpoint == "chains" and symbol:
+            strike_count = int(query.get("strikeCount", ["20"])[0])
+            return 200, synthetic_chain(symbol, strike_count=strike_count), {}
+        if provider == "tdameritrade" and endpoint == "hours":
+            return 200, synthetic_hours(), {}
+        if provider == "finnhub" and endpoint == "earnings":
+            return 200, synthetic_earnings(symbol, query.get("from", [""])[0], query.get("to", ["9999"])[0]), {}
+        return 404, {"error": f"unknown endpoint {path}"}, {}
+
+    @staticmethod
+    def _query_string(query):
+        return "&".join(f"{key}={values[0]}" for key, values in query.items())
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per response
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                status, body, headers = server.respond(parts.path, parse_qs(parts.query))
+                content = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the TD Ameritrade and Finnhub APIs.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", help="directory of recorded responses to serve before synthetic ones")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every response")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered with HTTP 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = MockApiServer(args.port, args.fixtures, args.latency_ms, args.rate_429, args.error_rate,
+                           args.retry_after, args.seed)
+    print(json.dumps({"base_urls": server.base_urls()}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Local stand-in for the TD Ameritrade streamer websocket.
+
+Answers LOGIN, SUBS and UNSUBS requests and pushes random-walk LEVELONE_OPTIONS and QUOTE
+updates for whatever is subscribed, starting from the synthetic chains mock_server.py serves.
+Point the app at it with the "streaming" section it prints:
+
+    python benchmarks/mock_stream.py --port 8766 --interval-ms 200
+
+Requires the aiohttp package.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from benchmarks.synthetic import synthetic_chain
+from quote_stream import OPTION_SERVICE, QUOTE_SERVICE, QUOTE_LAST_FIELD
+
+
+class MockStreamServer:
+    """Websocket server at /ws, running its own event loop in a thread once started."""
+
+    def __init__(self, port=0, interval_ms=200.0, updates_per_tick=10, disconnect_secs=0.0, seed=None):
+        self.requested_port = port
+        self.interval_secs = interval_ms / 1000
+        self.updates_per_tick = updates_per_tick
+        self.disconnect_secs = disconnect_secs
+        self.random = random.Random(seed)
+        self.port = None
+        self.requests = []
+        # symbol -> {"bid", "ask", "delta"} of options, ticker -> last price of underlyings
+        self.options = {}
+        self.underlyings = {}
+        self._loop = None
+        self._runner = None
+        self._started = threading.Event()
+
+    def url(self):
+        return f"ws://127.0.0.1:{self.port}/ws"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        self._started.wait()
+        return self
+
+    def serve_forever(self):
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._start_site())
+        self._started.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        future = asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop)
+        future.result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _start_site(self):
+        app = web.Application()
+        app.router.add_get("/ws", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.requested_port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def _load_ticker(self, ticker):
+        chain = synthetic_chain(ticker)
+        self.underlyings[ticker] = chain["underlyingPrice"]
+        for strikes in chain["putExpDateMap"].values():
+            for (option,) in strikes.values():
+                self.options[option["symbol"]] = {"bid": option["bid"], "ask": option["ask"],
+                                                  "delta": option["delta"]}
+
+    def _quote(self, service, key):
+        if service == QUOTE_SERVICE:
+            if key not in self.underlyings:
+                self._load_ticker(key)
+            price = round(max(0.01, self.underlyings[key] * self.random.uniform(0.998, 1.002)), 2)
+            self.underlyings[key] = price
+            return {"key": key, str(QUOTE_LAST_FIELD): price}
+        if key not in self.options:
+            self._load_ticker(key.split("_", 1)[0])
+        quote = self.options.get(key)
+        if quote is None:
+            return None
+        spread = quote["ask"] - quote["bid"]
+        quote["bid"] = round(max(0.01, quote["bid"] + self.random.choice((-0.02, -0.01, 0.01, 0.02))), 2)
+        quote["ask"] = round(quote["bid"] + spread, 2)
+        quote["delta"] = round(min(-0.01, max(-0.99, quote["delta"] + self.random.uniform(-0.005, 0.005))), 4)
+        return {"key": key, "2": quote["bid"], "3": quote["ask"], "32": quote["delta"]}
+
+    async def _handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        subscriptions = {OPTION_SERVICE: [], QUOTE_SERVICE: []}
+        pusher = asyncio.ensure_future(self._push(ws, subscriptions))
+        try:
+            async for message in ws:
+                for entry in json.loads(message.data).get("requests", []):
+                    self.requests.append(entry)
+                    service, command = entry.get("service"), entry.get("command")
+                    keys = [key for key in entry.get("parameters", {}).get("keys", "").split(",") if key]
+                    if command == "SUBS" and service in subscriptions:
+                        subscriptions[service] = keys
+                    elif command == "UNSUBS" and service in subscriptions:
+                        subscriptions[service] = [key for key in subscriptions[service] if key not in keys]
+                    await ws.send_str(json.dumps({"response": [{
+                        "service": service, "command": command, "requestid": entry.get("requestid"),
+                        "timestamp": int(time.time() * 1000), "content": {"code": 0, "msg": f"{command} OK"}}]}))
+        finally:
+            pusher.cancel()
+        return ws
+
+    async def _push(self, ws, subscriptions):
+        started = time.monotonic()
+        while not ws.closed:
+            await asyncio.sleep(self.interval_secs)
+            if self.disconnect_secs and time.monotonic() - started > self.disconnect_secs:
+                await ws.close()
+                return
+            data = []
+            for service, keys in subscriptions.items():
+                picked = self.random.sample(keys, min(len(keys), self.updates_per_tick))
+                content = [quote for quote in (self._quote(service, key) for key in picked) if quote is not None]
+                if content:
+                    data.append({"service": service, "timestamp": int(time.time() * 1000), "command": "SUBS",
+                                 "content": content})
+            if data:
+                await ws.send_str(json.dumps({"data": data}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the TD Ameritrade streamer websocket.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--interval-ms", type=float, default=200.0, help="time between quote updates")
+    parser.add_argument("--updates-per-tick", type=int, default=10, help="symbols quoted per service and update")
+    parser.add_argument("--disconnect-secs", type=float, default=0.0, help="drop every connection after this long")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = MockStreamServer(args.port, args.interval_ms, args.updates_per_tick, args.disconnect_secs,
+                              args.seed).start()
+    print(json.dumps({"streaming": {"url": server.url()}}), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Benchmark suite for the fetch -> filter -> render pipeline, with saved results for regression comparison.
+
+Run from the repository root:
+
+    python benchmarks/suite.py                       # everything, results saved to benchmarks/results/
+    python benchmarks/suite.py --only filter render  # a subset
+    python benchmarks/suite.py --quick --compare benchmarks/results/<previous>.json
+
+The fetch benchmark runs fetch_option_chain against benchmarks/mock_server.py, started in its own
+process with simulated latency, so no API keys or network are needed.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import chain_store
+import data_fetch
+import earnings_cache
+import http_client
+import rate_limiter
+import single_flight
+from benchmarks.synthetic import synthetic_chain, synthetic_tickers
+from chain_parser import parse_chain
+from main import format_option
+from options_view import OptionsView
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+MOCK_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py")
+
+# Chain shape: strikes per expiration x expirations in the DTE window
+CHAIN_SHAPES = [(10, 2), (20, 4), (50, 4), (20, 12), (100, 8), (200, 26)]
+FETCH_TICKERS = [10, 100, 1000, 5000]
+FETCH_WORKERS = [5, 20]
+FETCH_STRIKE_COUNTS = [10, 20, 50]
+FETCH_LATENCY_MS = 20
+RENDER_TICKERS = [10, 100, 1000, 5000]
+SCREEN_SIZE = (160, 50)
+
+
+def measure(func, min_secs=0.2):
+    """(best seconds per call, peak traced KiB of one call)."""
+    number = 1
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed >= min_secs or number >= 1000:
+            break
+        number *= 4
+    best = min([elapsed] + timeit.repeat(func, number=number, repeat=2)) / number
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 1024
+
+
+def result(benchmark, params, secs, peak_kib, items):
+    return {"benchmark": benchmark, "params": params, "secs": secs,
+            "peak_kib": round(peak_kib, 1) if peak_kib is not None else None,
+            "items_per_sec": round(items / secs, 1) if secs else None}
+
+
+def bench_filter():
+    for strike_count, expirations in CHAIN_SHAPES:
+        chain = synthetic_chain("BENCH", strike_count=strike_count, expirations=expirations)
+        secs, peak = measure(lambda: data_fetch.filter_and_sort_options(chain, 0.3, 50000.0, "arr"))
+        yield result("filter_and_sort_options", {"strikes": strike_count, "expirations": expirations},
+                     secs, peak, strike_count * expirations)
+
+
+def bench_put_call_ratio():
+    for strike_count, expirations in CHAIN_SHAPES:
+        chain = synthetic_chain("BENCH", strike_count=strike_count, expirations=expirations)
+        secs, peak = measure(lambda: data_fetch.calculate_put_call_ratio(chain))
+        yield result("calculate_put_call_ratio", {"strikes": strike_count, "expirations": expirations},
+                     secs, peak, 2 * strike_count * expirations)
+
+
+def start_mock_server(latency_ms):
+    process = subprocess.Popen([sys.executable, MOCK_SERVER, "--port", "0", "--latency-ms", str(latency_ms)],
+                               stdout=subprocess.PIPE, text=True)
+    return process, json.loads(process.stdout.readline())["base_urls"]
+
+
+def run_fetch(tickers, workers, strike_count, backend):
+    data_fetch.MAX_WORKERS = workers
+    data_fetch.STRIKE_COUNT_LIMIT = strike_count
+    http_client.reset_client()
+    # Fresh in-memory earnings cache, so every run pays for its earnings lookups
+    earnings_cache.configure_earnings_cache({"earnings_cache": {"path": ""}})
+    from_date = datetime.now() + timedelta(days=20)
+    to_date = datetime.now() + timedelta(days=50)
+    start = time.perf_counter()
+    options = data_fetch.fetch_option_chain("key", tickers, from_date, to_date, 0.3, 50000.0, "arr", "key",
+                                            backend=backend)
+    return time.perf_counter() - start, options
+
+
+def bench_fetch(max_tickers, backends):
+    process, base_urls = start_mock_server(FETCH_LATENCY_MS)
+    defaults = (data_fetch.MAX_WORKERS, data_fetch.STRIKE_COUNT_LIMIT)
+    try:
+        data_fetch.configure_base_urls({"base_urls": base_urls})
+        # The stand-in has no quota; keep the limiter out of the measurement
+        rate_limiter.configure_rate_limits({"rate_limits": {
+            "tdameritrade": {"requests_per_minute": 10 ** 7, "burst": 1000},
+            "finnhub": {"requests_per_minute": 10 ** 7, "burst": 1000}}})
+        chain_store.configure_chain_store({"chain_store": {"path": ""}})
+        # Every run has to hit the stand-in, not share the chains of the run before
+        single_flight.configure_coalescing({"coalescing": {"reuse_secs": 0}})
+
+        cases = [(count, workers, 20) for count in FETCH_TICKERS if count <= max_tickers for workers in FETCH_WORKERS]
+        cases += [(min(100, max_tickers), FETCH_WORKERS[0], strikes) for strikes in FETCH_STRIKE_COUNTS if strikes != 20]
+        for backend in backends:
+            for count, workers, strike_count in cases:
+                tickers = [(ticker, line) for line, ticker in enumerate(synthetic_tickers(count), start=1)]
+                secs, options = run_fetch(tickers, workers, strike_count, backend)
+                yield result("fetch_option_chain", {"tickers": count, "workers": workers, "strikes": strike_count,
+                                                    "backend": backend, "latency_ms": FETCH_LATENCY_MS},
+                             secs, None, count)
+    finally:
+        data_fetch.MAX_WORKERS, data_fetch.STRIKE_COUNT_LIMIT = defaults
+        data_fetch.configure_base_urls({})
+        http_client.reset_client()
+        process.terminate()
+        process.wait()
+
+
+def ranked_options(ticker_count):
+    chains = []
+    for line, ticker in enumerate(synthetic_tickers(ticker_count), start=1):
+        summary, table = parse_chain(json.dumps(synthetic_chain(ticker)).encode())
+        chains.append(data_fetch.make_chain(ticker, line, summary, table, datetime.now(), datetime.now(), [], True))
+    return data_fetch.rank_chains(chains, 0.3, 50000.0, "arr")
+
+
+def bench_render():
+    for count in RENDER_TICKERS:
+        options = ranked_options(count)
+        secs, peak = measure(lambda: [format_option(option) for option in options[:SCREEN_SIZE[1]]])
+        yield result("format_option", {"tickers": count, "rows": min(len(options), SCREEN_SIZE[1])},
+                     secs, peak, min(len(options), SCREEN_SIZE[1]))
+
+        def first_render():
+            view = OptionsView(format_option)
+            view.update(options)
+            view.render(SCREEN_SIZE)
+        secs, peak = measure(first_render)
+        yield result("refresh_display (first)", {"tickers": count, "rows": len(options)}, secs, peak, len(options))
+
+        view = OptionsView(format_option)
+        view.update(options)
+        view.render(SCREEN_SIZE)
+        rescored = [option.copy() for option in options]
+
+        def rerender():
+            view.update(rescored if view.walker.options is options else options)
+            view.render(SCREEN_SIZE)
+        secs, peak = measure(rerender)
+        yield result("refresh_display (update)", {"tickers": count, "rows": len(options)}, secs, peak, len(options))
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(entry):
+    return entry["benchmark"], json.dumps(entry["params"], sort_keys=True)
+
+
+def print_results(results, baseline=None):
+    previous = {result_key(entry): entry for entry in (baseline or {}).get("results", [])}
+    print(f"{'benchmark':<26} {'params':<62} {'ms':>10} {'peak KiB':>10} {'items/s':>12} {'vs base':>8}")
+    for entry in results:
+        params = ", ".join(f"{key}={value}" for key, value in entry["params"].items())
+        base = previous.get(result_key(entry))
+        ratio = f"{entry['secs'] / base['secs']:>7.2f}x" if base and base["secs"] else ""
+        # Fetches run across threads, where tracemalloc would distort the timing, so they have no peak
+        peak = f"{entry['peak_kib']:>10.1f}" if entry["peak_kib"] is not None else f"{'-':>10}"
+        print(f"{entry['benchmark']:<26} {params:<62} {entry['secs'] * 1000:>10.3f} {peak} "
+              f"{entry['items_per_sec'] or 0:>12.1f} {ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fetch -> filter -> render pipeline.")
+    parser.add_argument("--only", nargs="+", choices=("filter", "put_call_ratio", "fetch", "render"))
+    parser.add_argument("--quick", action="store_true", help="at most 1000 tickers")
+    parser.add_argument("--backends", nargs="+", default=["threads"], choices=("threads", "asyncio"))
+    parser.add_argument("--compare", help="results file to compare against")
+    parser.add_argument("--output", help="where to save the results (default: benchmarks/results/<time>-<rev>.json)")
+    args = parser.parse_args()
+
+    # Read the baseline first, so a wrong path does not cost a whole run
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+
+    max_tickers = 1000 if args.quick else max(FETCH_TICKERS)
+    suites = {
+        "filter": bench_filter,
+        "put_call_ratio": bench_put_call_ratio,
+        "fetch": lambda: bench_fetch(max_tickers, args.backends),
+        "render": bench_render,
+    }
+    results = []
+    for name in args.only or suites:
+        results.extend(suites[name]())
+
+    print_results(results, baseline)
+
+    revision = git_revision()
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{revision or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"revision": revision, "created": datetime.now().isoformat(), "python": platform.python_version(),
+                   "machine": platform.machine(), "cpus": os.cpu_count(), "results": results}, f, indent=1)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
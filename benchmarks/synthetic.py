@@ -0,0 +1,60 @@
+import random
+from datetime import datetime, timedelta
+
+
+def synthetic_chain(ticker, strike_count=20, expirations=4, first_dte=24, dte_step=7, seed=None):
+    """A TD Ameritrade style chain response with realistic-looking puts and calls."""
+    rng = random.Random(seed if seed is not None else ticker)
+    underlying_price = round(rng.uniform(10, 500), 2)
+    strike_step = max(0.5, round(underlying_price * 0.025, 1))
+    first_strike = underlying_price - strike_step * (strike_count // 2)
+
+    def side(put_call):
+        exp_date_map = {}
+        for expiration in range(expirations):
+            dte = first_dte + expiration * dte_step
+            expiration_date = (datetime.now() + timedelta(days=dte)).strftime('%Y-%m-%d')
+            strikes = {}
+            for index in range(strike_count):
+                strike = round(first_strike + index * strike_step, 1)
+                moneyness = (underlying_price - strike) / underlying_price
+                delta = max(0.01, min(0.99, 0.5 - moneyness * 4)) if put_call == "PUT" else \
+                    max(0.01, min(0.99, 0.5 + moneyness * 4))
+                bid = round(max(0.01, underlying_price * delta * 0.02 * (dte / 30) ** 0.5), 2)
+                ask = round(bid + rng.uniform(0.01, 0.3), 2)
+                symbol = f"{ticker}_{expiration_date.replace('-', '')}{put_call[0]}{strike}"
+                strikes[f"{strike:.1f}"] = [{
+                    "putCall": put_call,
+                    "symbol": symbol,
+                    "description": f"{ticker} {expiration_date} {strike} {put_call.title()}",
+                    "bid": bid,
+                    "ask": ask,
+                    "last": round((bid + ask) / 2, 2),
+                    "bidSize": rng.randint(1, 200),
+                    "askSize": rng.randint(1, 200),
+                    "totalVolume": rng.randint(0, 5000),
+                    "openInterest": rng.randint(0, 20000),
+                    "volatility": round(rng.uniform(15, 120), 3),
+                    "delta": -delta if put_call == "PUT" else delta,
+                    "gamma": 0.01,
+                    "theta": -0.05,
+                    "vega": 0.1,
+                    "strikePrice": strike,
+                    "daysToExpiration": dte,
+                    "expirationDate": 0,
+                    "inTheMoney": put_call == "PUT" and strike > underlying_price,
+                }]
+            exp_date_map[f"{expiration_date}:{dte}"] = strikes
+        return exp_date_map
+
+    return {
+        "symbol": ticker,
+        "status": "SUCCESS",
+        "underlyingPrice": underlying_price,
+        "putExpDateMap": side("PUT"),
+        "callExpDateMap": side("CALL"),
+    }
+
+
+def synthetic_tickers(count):
+    return [f"T{index:04d}" for index in range(count)]
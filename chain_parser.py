@@ -0,0 +1,65 @@
+import json
+
+from option_record import api_values
+from option_table import OptionTable
+
+OPTION_MAPS = ("putExpDateMap", "callExpDateMap")
+
+
+class ChainParser:
+    """object_hook for json.loads that handles each option contract the moment it is decoded.
+
+    Puts are reduced to their api_values for the OptionTable, which makes records only of the
+    rows it needs, put/call volume is summed on the way, and the contract objects are dropped
+    from the decoded tree, so the nested putExpDateMap/callExpDateMap dicts never hold more
+    than placeholders.
+    """
+
+    def __init__(self):
+        self.puts = []
+        self.put_count = 0
+        self.call_count = 0
+        self.put_volume = 0
+        self.call_volume = 0
+
+    def __call__(self, obj):
+        put_call = obj.get("putCall")
+        if put_call is None or "strikePrice" not in obj:
+            return obj
+        volume = obj.get("totalVolume") or 0
+        if put_call == "PUT":
+            self.put_count += 1
+            self.put_volume += volume
+            self.puts.append(api_values(obj))
+        else:
+            self.call_count += 1
+            self.call_volume += volume
+        return None
+
+    def put_call_ratio(self):
+        if self.call_volume != 0:
+            return self.put_volume / self.call_volume
+        return float('inf')  # Handle division by zero
+
+
+def parse_chain(content):
+    """Decode a chain response in one pass into (summary, OptionTable).
+
+    The summary holds the top-level fields of the response (symbol, underlyingPrice, ...) plus the
+    per-chain aggregates; "option_maps" lists which expiration maps were present. Returns
+    (None, None) if the body is not a JSON object.
+    """
+    parser = ChainParser()
+    data = json.loads(content, object_hook=parser)
+    if not isinstance(data, dict):
+        return None, None
+
+    summary = {key: value for key, value in data.items() if key not in OPTION_MAPS}
+    summary["option_maps"] = [name for name in OPTION_MAPS if name in data]
+    summary["put_count"] = parser.put_count
+    summary["call_count"] = parser.call_count
+    summary["put_volume"] = parser.put_volume
+    summary["call_volume"] = parser.call_volume
+    summary["put_call_ratio"] = parser.put_call_ratio()
+    return summary, OptionTable.from_api_values(parser.puts, data.get("underlyingPrice"),
+                                                 summary["put_call_ratio"])
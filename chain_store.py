@@ -0,0 +1,112 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from option_record import OptionRecord, api_values
+from option_table import OptionTable
+
+CHAIN_STORE_PATH = "chain_snapshots.sqlite"
+# Snapshots older than this are not worth showing at startup
+DEFAULT_MAX_AGE_DAYS = 7
+
+
+def option_fields(values):
+    # Keyed by the API field names, so snapshots survive changes to OptionRecord
+    return dict(zip(OptionRecord.API_FIELDS, values))
+
+
+class ChainStore:
+    """The last fetched chain of every ticker, persisted in SQLite.
+
+    The app starts from these snapshots, so the list shows up immediately (marked with its age)
+    while the first refresh runs in the background.
+    """
+
+    def __init__(self, path=CHAIN_STORE_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.max_age_secs = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS chains (ticker TEXT PRIMARY KEY, fetched_at REAL, "
+                                 "from_date TEXT, to_date TEXT, summary TEXT, options TEXT, earnings_dates TEXT, "
+                                 "earnings_data_retrieved INTEGER)")
+            except sqlite3.Error as e:
+                logging.error(f"Error: Unable to open chain store at {path}: {e}")
+                self._db = None
+
+    def save(self, chains):
+        """Replace the stored snapshot of each of the given chains."""
+        if self._db is None:
+            return
+        rows = [(chain["ticker"], chain["fetched_at"].timestamp(), chain["from_date"].isoformat(),
+                 chain["to_date"].isoformat(), json.dumps(chain["data"]),
+                 json.dumps([option_fields(values) for values in chain["table"].api_values()]),
+                 json.dumps(chain["earnings_dates"]), int(chain["earnings_data_retrieved"]))
+                for chain in chains]
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO chains VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                logging.error(f"Error: Unable to write chain store: {e}")
+
+    def load(self, tickers):
+        """Stored chains of the (ticker, line_number) pairs as {ticker: chain}, skipping expired ones."""
+        if self._db is None:
+            return {}
+        line_numbers = dict(tickers)
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute("DELETE FROM chains WHERE fetched_at < ?", (time.time() - self.max_age_secs,))
+                rows = self._db.execute("SELECT * FROM chains").fetchall()
+            except sqlite3.Error as e:
+                logging.error(f"Error: Unable to read chain store: {e}")
+                return {}
+
+        chains = {}
+        for ticker, fetched_at, from_date, to_date, summary, options, earnings_dates, earnings_data_retrieved in rows:
+            if ticker not in line_numbers:
+                continue
+            summary = json.loads(summary)
+            values = [api_values(option) for option in json.loads(options)]
+            chains[ticker] = {
+                "ticker": ticker,
+                # The watchlist may have been edited since the snapshot was taken
+                "line_number": line_numbers[ticker],
+                "data": summary,
+                "table": OptionTable.from_api_values(values, summary.get("underlyingPrice"), summary["put_call_ratio"]),
+                "from_date": datetime.fromisoformat(from_date),
+                "to_date": datetime.fromisoformat(to_date),
+                "earnings_dates": json.loads(earnings_dates),
+                "earnings_data_retrieved": bool(earnings_data_retrieved),
+                "fetched_at": datetime.fromtimestamp(fetched_at),
+            }
+        return chains
+
+
+_store = None
+_store_settings = {}
+_store_lock = threading.Lock()
+
+
+def configure_chain_store(system_config):
+    """Apply the optional "chain_store" section of the system config."""
+    global _store, _store_settings
+    with _store_lock:
+        _store_settings = dict(system_config.get("chain_store", {})) if system_config else {}
+        _store = None
+
+
+def get_chain_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ChainStore(path=_store_settings.get("path", CHAIN_STORE_PATH),
+                                max_age_days=float(_store_settings.get("max_age_days", DEFAULT_MAX_AGE_DAYS)))
+        return _store
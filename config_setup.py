@@ -57,6 +57,14 @@ def load_user_config():
     except json.decoder.JSONDecodeError as e:
         raise ValueError(f"Error: Unable to parse JSON data in user config file. JSONDecodeError: {e}")
 
+def read_user_scores():
+    """The "scores" section of the user config file as it is now on disk, or None if it cannot be read."""
+    try:
+        with open(USER_CONFIG_PATH, "r") as f:
+            return json.load(f).get("scores", {})
+    except (IOError, ValueError, AttributeError):
+        return None
+
 def create_user_config():
     # Ask the user for the config values
     while True:
@@ -1,169 +1,480 @@
 import logging
 import requests
 import sys
-import math
 from dateutil.parser import parse
 from datetime import datetime, timedelta
-import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-
-RETRY_WAIT_SECS = 50
+import http_client
+import earnings_cache
+import market_calendar
+import metrics
+from option_table import OptionTable, score_option, TOP_OPTIONS_PER_TICKER
+from chain_parser import parse_chain
+from chain_store import get_chain_store
+from single_flight import get_single_flight
+from top_options import TopOptions, option_sort_key
+
+MAX_WORKERS = 5
 STRIKE_COUNT_LIMIT = 20
+# API roots per provider; the "base_urls" section of the system config can point them elsewhere,
+# e.g. at the stand-in server of benchmarks/mock_server.py
+DEFAULT_BASE_URLS = {
+    "tdameritrade": "https://api.tdameritrade.com",
+    "finnhub": "https://finnhub.io/api",
+}
+_base_urls = dict(DEFAULT_BASE_URLS)
+# Size of the ranking across tickers (None: every selected option) and options kept per ticker
+# (None: no cap of its own); the "ranking" section of the system config sets them
+_ranking = {"top_n": None, "per_ticker": TOP_OPTIONS_PER_TICKER}
+
+
+def configure_base_urls(system_config):
+    _base_urls.clear()
+    _base_urls.update(DEFAULT_BASE_URLS)
+    if system_config:
+        _base_urls.update(system_config.get("base_urls", {}))
+
+
+def _ranking_size(settings, key, default):
+    value = settings.get(key, default)
+    if value is None or (isinstance(value, int) and not isinstance(value, bool) and value >= 1):
+        return value
+    logging.error(f"Invalid ranking setting {key}: {value!r} is not a positive integer or null, using {default}")
+    return default
+
+
+def configure_ranking(system_config):
+    settings = system_config.get("ranking", {}) if system_config else {}
+    _ranking["top_n"] = _ranking_size(settings, "top_n", None)
+    _ranking["per_ticker"] = _ranking_size(settings, "per_ticker", TOP_OPTIONS_PER_TICKER)
+
 
-def make_api_request(api_key, endpoint):
+def ranking_limit(limit=None):
+    """The size of the ranking across tickers, capped further by limit if given; None for no limit."""
+    limits = [value for value in (_ranking["top_n"], limit) if value is not None]
+    return min(limits) if limits else None
+
+
+def ticker_limit(limit=None):
+    """How many options of one ticker can make it into a ranking of ranking_limit(limit); None for all."""
+    limits = [value for value in (_ranking["per_ticker"], ranking_limit(limit)) if value is not None]
+    return min(limits) if limits else None
+
+
+def base_url(provider):
+    return _base_urls[provider].rstrip("/")
+
+def get_http_client():
+    # One connection per worker thread for each host
+    return http_client.get_client(pool_size=MAX_WORKERS)
+
+def make_api_request(api_key, endpoint, provider="tdameritrade", parse=None):
+    """GET an endpoint and decode the JSON body, or hand the raw bytes to parse if given."""
     try:
-        response = requests.get(endpoint)
+        response = get_http_client().get(endpoint, provider=provider)
     except requests.exceptions.RequestException as e:
         logging.error(f"Error connecting to API: {e}")
         raise
 
     if response.status_code == 429:
-      logging.warning(f"Rate limited. Sleeping {RETRY_WAIT_SECS} seconds")
-      time.sleep(RETRY_WAIT_SECS)
+        logging.warning(f"Rate limited. Giving up after {http_client.MAX_RETRIES} retries")
 
     elif response.status_code == 200:
-        return response.json()
+        if parse is None:
+            return response.json()
+        try:
+            with metrics.span("parse"):
+                return parse(response.content)
+        except ValueError as e:
+            logging.error(f"Error decoding API response: {e}")
+            return None
 
     else:
         logging.error(f"Error fetching data from API. Status code: {response.status_code}")
         raise Exception(f"API request failed with status {response.status_code}")
 
 
-def is_market_open(api_key):
-    """Check if the market is open."""
-    endpoint = f"https://api.tdameritrade.com/v1/marketdata/OPTION/hours?apikey={api_key}"
+def parse_market_sessions(data):
+    """Regular session (start, end) pairs of the option products open that day, or None for an unexpected response."""
+    if not data or "option" not in data:
+        return None
+    sessions = []
+    # Iterate over each product in the option market
+    for product in data["option"].values():
+        if "isOpen" in product and product["isOpen"]:
+            for session in product["sessionHours"]["regularMarket"]:
+                sessions.append((parse(session["start"]), parse(session["end"])))
+    return sessions
 
-    data = make_api_request(api_key, endpoint)
 
-    # Check if the response contains the expected data
-    if data and "option" in data:
-        # Iterate over each product in the option market
-        for product in data["option"].values():
-            if "isOpen" in product and product["isOpen"]:
-                for session in product["sessionHours"]["regularMarket"]:
-                    start_time = parse(session["start"])
-                    end_time = parse(session["end"])
-                    current_time = datetime.now(start_time.tzinfo) # ensures the current time is timezone aware
-
-                    if start_time <= current_time <= end_time:
-                        # Market is open for this product
-                        return True
+def ensure_market_hours(api_key):
+    """Load today's session hours into the market calendar unless already cached; False on failure."""
+    calendar = market_calendar.get_market_calendar()
+    if calendar.has_sessions():
+        return True
+
+    sessions = parse_market_sessions(make_api_request(api_key, hours_endpoint(api_key)))
+    if sessions is None:
         return False
+    calendar.set_sessions(None, sessions)
+    return True
 
-    print("Error: The API response did not contain the expected data.")
-    sys.exit(1)
-def filter_and_sort_options(data, max_delta, buying_power, sorting_method):
-    """Filter options based on the delta range and calculate the ARR for each option."""
-    options = []
-    put_call_ratio = calculate_put_call_ratio(data)
-    put_exp_date_map = data.get("putExpDateMap", {})
-    for date in put_exp_date_map:
-        for strike_price in put_exp_date_map[date]:
-            for option in put_exp_date_map[date][strike_price]:
-                option['underlyingPrice'] = data['underlyingPrice']
-                delta = abs(float(option["delta"]))
-                if 0 <= delta <= max_delta:
-                    option["delta"] = abs(float(option["delta"]))
-                    option["no_of_contracts_to_write"] = math.floor(buying_power / (float(option["strikePrice"]) * 100))
-                    if option["no_of_contracts_to_write"] < 1:
-                        option["message"] = "Not enough buying power"
-                    option["premium_usd"] = round(option["no_of_contracts_to_write"] * float(option["bid"]) * 100, 2)
-                    option["premium_per_day"] = round(option["premium_usd"] / option["daysToExpiration"] \
-                                                      if option["daysToExpiration"] != 0 else \
-                                                      option["premium_usd"], 2)
-                    option["arr"] = round(option["premium_usd"] / buying_power * 365 / int(option["daysToExpiration"]) * 100, 3)
-                    option["put_call_ratio"] = put_call_ratio
-                    options.append(option)
-
-    options = sorted(options, key=lambda option: option.get(sorting_method, -1), reverse=True)[:5]
-    return options
+
+def is_market_open(api_key):
+    """Check if the market is open."""
+    # Check if the response contains the expected data
+    if not ensure_market_hours(api_key):
+        print("Error: The API response did not contain the expected data.")
+        sys.exit(1)
+    return market_calendar.get_market_calendar().is_open()
+
+def filter_and_sort_options(data, max_delta, buying_power, sorting_method, table=None, limit=TOP_OPTIONS_PER_TICKER,
+                            above=None, dte_range=None):
+    """Filter options based on the delta range and calculate the ARR for each option.
+
+    Scoring and top-k selection run vectorized on an OptionTable; pass a prebuilt table to skip
+    flattening the chain again. At most limit options are returned, all of them with None; with
+    above given, only those scoring higher (for the numeric sorting methods). dte_range (min, max)
+    narrows the expirations down to a part of the fetched window.
+    """
+    with metrics.span("filter"):
+        if table is None:
+            table = OptionTable.from_chain(data, calculate_put_call_ratio(data))
+        return table.top_options(max_delta, buying_power, sorting_method, limit, above, dte_range)
 
 def handle_api_error(ticker):
     logging.error(f"Error: Unable to make API request for {ticker}")
 
 
-def fetch_option_for_ticker(api_key, ticker, line_number, from_date, to_date, max_delta, buying_power, sorting_method,
-                       finnhub_api_key):
-    earnings_data_retrieved = False
+def hours_endpoint(api_key):
+    return f"{base_url('tdameritrade')}/v1/marketdata/OPTION/hours?apikey={api_key}&date={datetime.now().strftime('%Y-%m-%d')}"
 
-    try:
-        endpoint = f"https://api.tdameritrade.com/v1/marketdata/chains?apikey={api_key}&symbol={ticker}&strikeCount={STRIKE_COUNT_LIMIT}&includeQuotes=TRUE&fromDate={from_date.strftime('%Y-%m-%d')}&toDate={to_date.strftime('%Y-%m-%d')}"
-        data = make_api_request(api_key, endpoint)
 
-        if not data or ("putExpDateMap" not in data and "callExpDateMap" not in data):
-            handle_api_error(ticker)
-            return []
+def chain_endpoint(api_key, ticker, from_date, to_date):
+    return f"{base_url('tdameritrade')}/v1/marketdata/chains?apikey={api_key}&symbol={ticker}&strikeCount={STRIKE_COUNT_LIMIT}&includeQuotes=TRUE&fromDate={from_date.strftime('%Y-%m-%d')}&toDate={to_date.strftime('%Y-%m-%d')}"
+
+
+def earnings_endpoint(ticker, to_date, finnhub_api_key):
+    # Without a ticker Finnhub returns the calendar of the whole market for the date range
+    symbol = f"&symbol={ticker}" if ticker else ""
+    return f"{base_url('finnhub')}/v1/calendar/earnings?from={datetime.now().strftime('%Y-%m-%d')}&to={to_date.strftime('%Y-%m-%d')}{symbol}&token={finnhub_api_key}"
+
+
+def is_valid_chain(summary):
+    """True for a parse_chain summary of a response that contained option maps."""
+    return bool(summary) and bool(summary.get("option_maps"))
 
-        options = filter_and_sort_options(data, float(max_delta), float(buying_power), sorting_method)
 
-        options = [option for option in options if option.get("put_call_ratio") != float('inf')]
+def parse_earnings_dates(earnings_data):
+    return sorted(entry["date"] for entry in (earnings_data or {}).get('earningsCalendar', []) if entry.get("date"))
 
-        # Check if we have any options for the ticker
-        if options:
-            # Compute the maximum expiration_date_str for the current ticker
-            expiration_date_str = max(
-                (datetime.now() + timedelta(days=option["daysToExpiration"])).strftime('%Y-%m-%d') for option in
-                options)
 
-            finnhub_endpoint = f"https://finnhub.io/api/v1/calendar/earnings?from={datetime.now().strftime('%Y-%m-%d')}&to={expiration_date_str}&symbol={ticker}&token={finnhub_api_key}"
-            # Try the request up to two times (original try + 1 retry)
-            for _ in range(2):
-                response = requests.get(finnhub_endpoint)
+def group_earnings_dates(earnings_data):
+    dates_by_ticker = {}
+    for entry in (earnings_data or {}).get('earningsCalendar', []):
+        if entry.get("symbol") and entry.get("date"):
+            dates_by_ticker.setdefault(entry["symbol"], []).append(entry["date"])
+    return dates_by_ticker
 
-                if response.status_code == 429:
-                    logging.error("Rate limit reached. Waiting {RETRY_WAIT_SECS} seconds before retrying...")
-                    time.sleep(RETRY_WAIT_SECS)
-                else:
-                    break
 
-            if response.status_code == 200 and response.text:
-                earnings_data = response.json()
-                has_earnings = earnings_data.get('earningsCalendar', []) != []
+def fetch_earnings_dates(ticker, to_date, finnhub_api_key):
+    """Earnings dates from today until to_date, from the earnings cache when possible; None on failure."""
+    cache = earnings_cache.get_cache()
+    from_date = datetime.now()
+    dates = cache.get(ticker, from_date, to_date)
+    if dates is not None:
+        return dates
+
+    # Pacing, retries and 429 backoff are handled by the shared client
+    response = get_http_client().get(earnings_endpoint(ticker, to_date, finnhub_api_key), provider="finnhub")
+
+    if response.status_code == 200 and response.text:
+        dates = parse_earnings_dates(response.json())
+        cache.put(ticker, from_date, to_date, dates)
+        return dates
+
+    logging.error(f"Error: Unable to fetch earnings data for {ticker}. HTTP status code: {response.status_code}")
+    return None
+
+
+def prefetch_earnings(tickers, to_date, finnhub_api_key):
+    """Fill the earnings cache with a single market-wide calendar query when many tickers are missing."""
+    cache = earnings_cache.get_cache()
+    from_date = datetime.now()
+    missing = {ticker for ticker, _ in tickers if cache.get(ticker, from_date, to_date) is None}
+    if len(missing) < earnings_cache.bulk_min_tickers():
+        return
+
+    try:
+        with metrics.span("earnings_bulk"):
+            response = get_http_client().get(earnings_endpoint(None, to_date, finnhub_api_key), provider="finnhub")
+    except requests.exceptions.RequestException:
+        logging.exception("There was an exception when fetching the earnings calendar.")
+        return
+    if response.status_code != 200 or not response.text:
+        logging.error(f"Error: Unable to fetch the earnings calendar. HTTP status code: {response.status_code}")
+        return
+
+    earnings_data = response.json()
+    dates_by_ticker = group_earnings_dates(earnings_data)
+    if len((earnings_data or {}).get('earningsCalendar', [])) < earnings_cache.bulk_max_entries():
+        cache.put_many({ticker: dates_by_ticker.get(ticker, []) for ticker in missing}, from_date, to_date)
+    else:
+        # The calendar may have been cut off, so a ticker missing from it is not known to have no
+        # earnings; those are left to the per-ticker queries
+        logging.warning("The earnings calendar may be incomplete, looking up the tickers missing from it one by one.")
+        cache.put_many({ticker: dates for ticker, dates in dates_by_ticker.items() if ticker in missing},
+                       from_date, to_date)
+
+
+def make_chain(ticker, line_number, summary, table, from_date, to_date, earnings_dates, earnings_data_retrieved):
+    """Everything fetched for one ticker; options are derived from it locally by options_from_chain."""
+    return {
+        "ticker": ticker,
+        "line_number": line_number,
+        "data": summary,
+        "table": table,
+        "from_date": from_date,
+        "to_date": to_date,
+        "earnings_dates": earnings_dates,
+        "earnings_data_retrieved": earnings_data_retrieved,
+        "fetched_at": datetime.now(),
+    }
+
+
+def annotate_options(options, ticker, line_number, has_earnings, earnings_data_retrieved):
+    for option in options:
+        option.ticker = ticker
+        option.line_number = line_number
+        option.has_earnings = has_earnings
+        option.earnings_data_retrieved = earnings_data_retrieved
+    return options
+
+
+def options_from_chain(chain, max_delta, buying_power, sorting_method, limit=None, above=None, dte_range=None):
+    """Select and score the best options of an already fetched chain. No API calls are made.
+
+    limit is the size of the ranking the options are meant for, see ranking_limit; options not
+    scoring above `above` could not enter it anyway and are skipped. See filter_and_sort_options
+    for dte_range.
+    """
+    options = filter_and_sort_options(chain["data"], float(max_delta), float(buying_power), sorting_method,
+                                      table=chain["table"], limit=ticker_limit(limit), above=above,
+                                      dte_range=dte_range)
+
+    options = [option for option in options if option.put_call_ratio != float('inf')]
+
+    if options:
+        # Earnings matter if they fall between today and the latest expiration among the selected options;
+        # a chain kept since an earlier day can still hold dates that have passed
+        today = datetime.now()
+        today_str = today.strftime('%Y-%m-%d')
+        expiration_date_str = max(
+            (today + timedelta(days=option.days_to_expiration)).strftime('%Y-%m-%d') for option in options)
+        has_earnings = any(today_str <= date <= expiration_date_str for date in chain["earnings_dates"])
+        annotate_options(options, chain["ticker"], chain["line_number"], has_earnings,
+                         chain["earnings_data_retrieved"])
+    return options
+
+
+def rank_chains(chains, max_delta, buying_power, sorting_method, limit=None, dte_range=None):
+    """The best options of all chains for the given filters, sorted regardless of their ticker.
+
+    Only the top ranking_limit(limit) options are kept while the chains are ranked.
+    """
+    limit = ranking_limit(limit)
+    top = TopOptions(sorting_method, limit)
+    for chain in chains:
+        top.add(options_from_chain(chain, max_delta, buying_power, sorting_method, limit, top.threshold(),
+                                   dte_range))
+    return top.ranked()
+
+
+def apply_quotes(chains, option_quotes, underlying_prices):
+    """Update the cached chains with streamed quotes, so re-ranking them uses the live prices."""
+    quotes_by_ticker = {}
+    for symbol, values in option_quotes.items():
+        # Option symbols start with their underlying, e.g. SPY_121523P450
+        quotes_by_ticker.setdefault(symbol.split("_", 1)[0], {})[symbol] = values
+    for ticker in set(quotes_by_ticker) | set(underlying_prices):
+        chain = chains.get(ticker)
+        if chain is not None:
+            chain["table"].apply_quotes(quotes_by_ticker.get(ticker, {}), underlying_prices.get(ticker))
+
+
+def requote_options(options, option_quotes, underlying_prices, buying_power, max_delta=None):
+    """The options with streamed quotes applied to copies of the ones they concern, rescored.
+
+    With max_delta given, options whose streamed delta left the delta range are dropped.
+    """
+    requoted = []
+    for option in options:
+        values = option_quotes.get(option.symbol)
+        underlying_price = underlying_prices.get(option.ticker)
+        if values is None and underlying_price is None:
+            requoted.append(option)
+            continue
+        option = option.copy()
+        for field, value in (values or {}).items():
+            setattr(option, field, abs(value) if field == "delta" else value)
+        if max_delta is not None and option.delta > float(max_delta):
+            continue
+        if underlying_price is not None:
+            option.underlying_price = underlying_price
+        requoted.append(score_option(option, float(buying_power)))
+    return requoted
+
+
+def chain_key(ticker, from_date, to_date):
+    # What identifies a chain request; the endpoint only has day resolution
+    return "chain", ticker, from_date.date(), to_date.date(), STRIKE_COUNT_LIMIT
+
+
+def with_line_number(chain, line_number):
+    # A chain shared with another request for the ticker may come from another watchlist line
+    if chain is None or chain["line_number"] == line_number:
+        return chain
+    return dict(chain, line_number=line_number)
+
+
+def unique_tickers(tickers):
+    """The (ticker, line_number) pairs without blank lines and repeated tickers, keeping the first line."""
+    seen = set()
+    unique = []
+    for ticker, line_number in tickers:
+        ticker = ticker.strip().upper()
+        if ticker and ticker not in seen:
+            seen.add(ticker)
+            unique.append((ticker, line_number))
+    return unique
+
+
+def fetch_chain_for_ticker(api_key, ticker, line_number, from_date, to_date, finnhub_api_key):
+    """Fetch the option chain and earnings dates of a ticker; None if no usable chain came back.
+
+    Shares the result of an identical fetch that is in flight or has just completed, see single_flight.
+    """
+    chain = get_single_flight().call(
+        chain_key(ticker, from_date, to_date),
+        lambda: request_chain_for_ticker(api_key, ticker, line_number, from_date, to_date, finnhub_api_key))
+    return with_line_number(chain, line_number)
+
+
+def request_chain_for_ticker(api_key, ticker, line_number, from_date, to_date, finnhub_api_key):
+    earnings_data_retrieved = False
+    earnings_dates = []
+
+    try:
+        with metrics.span("chain", ticker):
+            parsed = make_api_request(api_key, chain_endpoint(api_key, ticker, from_date, to_date), parse=parse_chain)
+        summary, table = parsed or (None, None)
+
+        if not is_valid_chain(summary):
+            handle_api_error(ticker)
+            return None
+
+        # Earnings only matter for tickers with puts to sell
+        if len(table):
+            with metrics.span("earnings", ticker):
+                dates = fetch_earnings_dates(ticker, to_date, finnhub_api_key)
+            if dates is not None:
+                earnings_dates = dates
                 earnings_data_retrieved = True
-            else:
-                logging.error(
-                    f"Error: Unable to fetch earnings data for {ticker}. HTTP status code: {response.status_code}")
-                has_earnings = False  # Default value if unable to fetch earnings data
-
-            for option in options:
-                option["ticker"] = ticker
-                option["line_number"] = line_number
-                option["has_earnings"] = has_earnings
-                option["earnings_data_retrieved"] = earnings_data_retrieved
-                option["underlying_iv"] = option['volatility']
-        return options
+
+        return make_chain(ticker, line_number, summary, table, from_date, to_date, earnings_dates,
+                          earnings_data_retrieved)
 
     except requests.exceptions.RequestException as e:
         handle_api_error(ticker)
         logging.exception("There was an exception when making an API request.")
-        return []
+        return None
 
 
-def fetch_option_chain(api_key, tickers, from_date, to_date, max_delta, buying_power, sorting_method, finnhub_api_key):
-    all_options = []
+def sort_all_options(all_options, sorting_method):
+    # Sort all options regardless of their ticker
+    all_options.sort(key=option_sort_key(sorting_method), reverse=True)
+    return all_options
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
+
+def iter_chains(api_key, tickers, from_date, to_date, finnhub_api_key, cancel_event=None):
+    """Yield (ticker, chain) for every ticker as soon as its fetch completes.
+
+    Tickers whose fetch failed are yielded with None. Setting cancel_event cancels the tickers not
+    started yet and ends the iteration.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         futures = {
-            executor.submit(fetch_option_for_ticker, api_key, ticker, line_number, from_date, to_date,
-                            max_delta, buying_power, sorting_method, finnhub_api_key): ticker for ticker, line_number in
-            tickers}
+            executor.submit(fetch_chain_for_ticker, api_key, ticker, line_number, from_date, to_date,
+                            finnhub_api_key): ticker for ticker, line_number in tickers}
 
         for future in as_completed(futures):
+            if cancel_event is not None and cancel_event.is_set():
+                for pending in futures:
+                    pending.cancel()
+                return
+
             exception = future.exception()
             if exception is not None:
-                ticker = futures[future]
-                if ticker in tickers:  # check if the ticker is in the list
-                    tickers.remove(ticker)  # if yes, remove the ticker from the list
+                logging.error(f"Error: Unable to fetch options for {futures[future]}: {exception}")
+                yield futures[future], None
             else:
-                all_options.extend(future.result())
-
-    # Sort all options regardless of their ticker
-    if sorting_method == "message":
-        all_options.sort(key=lambda option: option.get(sorting_method, ""), reverse=True)
+                yield futures[future], future.result()
+
+
+def fetch_chains(api_key, tickers, from_date, to_date, finnhub_api_key, backend="threads", progress_callback=None,
+                 cancel_event=None, chain_callback=None):
+    """Fetch raw chains for all tickers and return them as {ticker: chain}.
+
+    Callbacks are invoked from the fetching thread: chain_callback(ticker, chain) as each ticker
+    completes (chain is None on failure), followed by progress_callback(done, total). Setting
+    cancel_event stops scheduling further tickers; the chains gathered so far are returned.
+    Every fetched chain is saved to the chain store as the snapshot to start from next time.
+    Repeated tickers are fetched once, so progress counts the unique tickers.
+    """
+    tickers = unique_tickers(tickers)
+    prefetch_earnings(tickers, to_date, finnhub_api_key)
+
+    if backend == "asyncio":
+        # Imported lazily so the threaded backend does not require aiohttp
+        import asyncio
+        from async_fetch import fetch_chains_async
+        chains = asyncio.run(fetch_chains_async(api_key, tickers, from_date, to_date, finnhub_api_key,
+                                                progress_callback, cancel_event, chain_callback))
     else:
-        all_options.sort(key=lambda option: float(option.get(sorting_method, "Key not present")), reverse=True)
-
-    return all_options
+        chains = {}
+        for done, (ticker, chain) in enumerate(iter_chains(api_key, tickers, from_date, to_date, finnhub_api_key,
+                                                           cancel_event), start=1):
+            if chain is not None:
+                chains[ticker] = chain
+            if chain_callback is not None:
+                chain_callback(ticker, chain)
+            if progress_callback is not None:
+                progress_callback(done, len(tickers))
+
+    # The asyncio backend records its requests in the same per-host stats
+    get_http_client().publish_stats()
+    get_chain_store().save(chains.values())
+    metrics.count("refreshes")
+    metrics.write_metrics()
+    return chains
+
+
+def fetch_option_chain(api_key, tickers, from_date, to_date, max_delta, buying_power, sorting_method, finnhub_api_key,
+                       backend="threads", progress_callback=None, cancel_event=None, result_callback=None):
+    """Fetch and rank options for all tickers.
+
+    result_callback(ticker, options) is invoked from the fetching thread as each ticker completes;
+    see fetch_chains for the other arguments.
+    """
+    chain_callback = None
+    if result_callback is not None:
+        def chain_callback(ticker, chain):
+            result_callback(ticker, [] if chain is None else
+                            options_from_chain(chain, max_delta, buying_power, sorting_method))
+
+    chains = fetch_chains(api_key, tickers, from_date, to_date, finnhub_api_key, backend, progress_callback,
+                          cancel_event, chain_callback)
+    return rank_chains(chains.values(), max_delta, buying_power, sorting_method)
 
 def calculate_put_call_ratio(data):
     put_options = data.get('putExpDateMap', {})
@@ -0,0 +1,118 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+EARNINGS_CACHE_PATH = "earnings_cache.sqlite"
+DEFAULT_TTL_HOURS = 12
+DEFAULT_MAX_ENTRIES = 2000
+# From this many uncached tickers on, one date-range query for the whole market beats per-symbol calls
+DEFAULT_BULK_MIN_TICKERS = 20
+# Finnhub cuts the market-wide calendar off at 1500 entries; one that long may be missing tickers
+DEFAULT_BULK_MAX_ENTRIES = 1500
+
+
+class EarningsCache:
+    """Earnings dates per ticker and date window, with TTL, LRU eviction and SQLite persistence.
+
+    An entry answers any request whose window lies inside the cached one, so a lookup made
+    with a shorter DTE window, or later on the same day, does not hit Finnhub again.
+    """
+
+    def __init__(self, path=EARNINGS_CACHE_PATH, ttl_hours=DEFAULT_TTL_HOURS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl_secs = ttl_hours * 3600
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # ticker -> (fetched_at, from_date, to_date, dates)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS earnings (ticker TEXT PRIMARY KEY, fetched_at REAL, "
+                                 "from_date TEXT, to_date TEXT, dates TEXT)")
+                self._load()
+            except sqlite3.Error as e:
+                logging.error(f"Error: Unable to open earnings cache at {path}: {e}")
+                self._db = None
+
+    def get(self, ticker, from_date, to_date):
+        """Cached earnings dates within the window, or None if the window is not fully covered."""
+        from_str, to_str = from_date.strftime('%Y-%m-%d'), to_date.strftime('%Y-%m-%d')
+        with self._lock:
+            entry = self._entries.get(ticker)
+            if entry is None:
+                return None
+            fetched_at, cached_from, cached_to, dates = entry
+            if time.time() - fetched_at > self.ttl_secs:
+                del self._entries[ticker]
+                return None
+            if not cached_from <= from_str or not to_str <= cached_to:
+                return None
+            self._entries.move_to_end(ticker)
+            return [date for date in dates if from_str <= date <= to_str]
+
+    def put(self, ticker, from_date, to_date, dates):
+        self.put_many({ticker: dates}, from_date, to_date)
+
+    def put_many(self, dates_by_ticker, from_date, to_date):
+        from_str, to_str = from_date.strftime('%Y-%m-%d'), to_date.strftime('%Y-%m-%d')
+        now = time.time()
+        with self._lock:
+            for ticker, dates in dates_by_ticker.items():
+                self._entries[ticker] = (now, from_str, to_str, sorted(dates))
+                self._entries.move_to_end(ticker)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            if self._db is not None:
+                try:
+                    with self._db:
+                        self._db.executemany(
+                            "INSERT OR REPLACE INTO earnings VALUES (?, ?, ?, ?, ?)",
+                            [(ticker, now, from_str, to_str, json.dumps(sorted(dates)))
+                             for ticker, dates in dates_by_ticker.items()])
+                        self._db.executemany("DELETE FROM earnings WHERE ticker = ?", [(t,) for t in evicted])
+                except sqlite3.Error as e:
+                    logging.error(f"Error: Unable to write earnings cache: {e}")
+
+    def _load(self):
+        # Warm the in-memory LRU from disk, dropping whatever has expired meanwhile
+        with self._db:
+            self._db.execute("DELETE FROM earnings WHERE fetched_at < ?", (time.time() - self.ttl_secs,))
+        rows = self._db.execute("SELECT ticker, fetched_at, from_date, to_date, dates FROM earnings "
+                                "ORDER BY fetched_at DESC LIMIT ?", (self.max_entries,)).fetchall()
+        for ticker, fetched_at, from_date, to_date, dates in reversed(rows):
+            self._entries[ticker] = (fetched_at, from_date, to_date, json.loads(dates))
+
+
+_cache = None
+_cache_settings = {}
+_cache_lock = threading.Lock()
+
+
+def configure_earnings_cache(system_config):
+    """Apply the optional "earnings_cache" section of the system config."""
+    global _cache, _cache_settings
+    with _cache_lock:
+        _cache_settings = dict(system_config.get("earnings_cache", {})) if system_config else {}
+        _cache = None
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EarningsCache(path=_cache_settings.get("path", EARNINGS_CACHE_PATH),
+                                   ttl_hours=float(_cache_settings.get("ttl_hours", DEFAULT_TTL_HOURS)),
+                                   max_entries=int(_cache_settings.get("max_entries", DEFAULT_MAX_ENTRIES)))
+        return _cache
+
+
+def bulk_min_tickers():
+    return int(_cache_settings.get("bulk_min_tickers", DEFAULT_BULK_MIN_TICKERS))
+
+
+def bulk_max_entries():
+    return int(_cache_settings.get("bulk_max_entries", DEFAULT_BULK_MAX_ENTRIES))
@@ -0,0 +1,199 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import api_fixtures
+import metrics
+import rate_limiter
+
+POOL_SIZE = 5
+MAX_RETRIES = 4
+BACKOFF_BASE_SECS = 1.0
+BACKOFF_MAX_SECS = 60
+REQUEST_TIMEOUT_SECS = 30
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) into seconds to wait."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def compute_backoff(attempt, retry_after=None):
+    """Jittered exponential backoff, never shorter than what the server asked for."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECS, BACKOFF_BASE_SECS * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class HostStats:
+    __slots__ = ("requests", "new_connections", "retries", "wait_secs", "throttle_secs")
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.retries = 0
+        self.wait_secs = 0.0
+        self.throttle_secs = 0.0
+
+    def as_dict(self):
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+            "retries": self.retries,
+            "wait_secs": round(self.wait_secs, 2),
+            "throttle_secs": round(self.throttle_secs, 2),
+        }
+
+
+class HttpClient:
+    """Keep-alive session with one connection pool per host and retry/backoff on 429 and 5xx."""
+
+    def __init__(self, pool_size=POOL_SIZE, max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT_SECS):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self._session = requests.Session()
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._seen_connections = {}
+
+    def get(self, url, provider=None, **kwargs):
+        """GET with retries; every attempt first draws a token from the provider's rate limiter."""
+        host = urlsplit(url).hostname
+        limiter = rate_limiter.get_limiter(provider)
+        attempt = 0
+        while True:
+            if limiter is not None:
+                self._record_throttle(host, limiter.acquire())
+            try:
+                response = self._session.get(url, timeout=self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record_request(host)
+                if attempt >= self.max_retries:
+                    raise
+                delay = compute_backoff(attempt)
+                logging.warning(f"Request to {host} failed ({e}). Retrying in {delay:.1f} seconds")
+            else:
+                self._record_request(host)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    api_fixtures.record_response(provider, url, response.status_code, response.content)
+                    return response
+                if response.status_code == 429:
+                    metrics.count("http_429")
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                delay = compute_backoff(attempt, retry_after)
+                logging.warning(f"HTTP {response.status_code} from {host}. Retrying in {delay:.1f} seconds")
+
+            self._record_wait(host, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        """Per-host counters: requests, new connections, reuse ratio, retries, backoff and throttle seconds."""
+        with self._lock:
+            return {host: stats.as_dict() for host, stats in self._stats.items()}
+
+    def publish_stats(self):
+        """Put the per-host stats into the metrics snapshot, for the metrics file and the stats overlay."""
+        metrics.get_metrics().set_hosts(self.stats())
+
+    def close(self):
+        self._session.close()
+
+    def record_stats(self, host, requests=0, new_connections=0, retries=0, wait_secs=0.0, throttle_secs=0.0):
+        """Add to the per-host counters for requests made by another transport, e.g. the asyncio backend."""
+        with self._lock:
+            stats = self._host_stats(host)
+            stats.requests += requests
+            stats.new_connections += new_connections
+            stats.retries += retries
+            stats.wait_secs += wait_secs
+            stats.throttle_secs += throttle_secs
+
+    def _host_stats(self, host):
+        stats = self._stats.get(host)
+        if stats is None:
+            stats = self._stats[host] = HostStats()
+        return stats
+
+    def _record_request(self, host):
+        metrics.count("http_requests")
+        with self._lock:
+            stats = self._host_stats(host)
+            stats.requests += 1
+            opened = self._opened_connections(host)
+            stats.new_connections += max(0, opened - self._seen_connections.get(host, 0))
+            self._seen_connections[host] = opened
+
+    def _record_wait(self, host, delay):
+        metrics.count("http_retries")
+        metrics.count("backoff_secs", delay)
+        with self._lock:
+            stats = self._host_stats(host)
+            stats.retries += 1
+            stats.wait_secs += delay
+
+    def _record_throttle(self, host, waited):
+        if waited:
+            metrics.count("throttle_secs", waited)
+            with self._lock:
+                self._host_stats(host).throttle_secs += waited
+
+    def _opened_connections(self, host):
+        # urllib3 keeps a running count of connections each pool has ever opened
+        pools = self._adapter.poolmanager.pools
+        opened = 0
+        for key in list(pools.keys()):
+            if key.key_host == host:
+                pool = pools.get(key)
+                if pool is not None:
+                    opened += pool.num_connections
+        return opened
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(pool_size=POOL_SIZE):
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(pool_size=pool_size)
+        return _client
+
+
+def reset_client():
+    """Drop the shared client so the next get_client() builds fresh pools."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
@@ -1,74 +1,147 @@
-from datetime import datetime, timedelta
+from datetime import datetime
+import os
+import queue
+import sys
+import threading
 import urwid
-from config_setup import load_user_config, load_system_config, save_user_config, read_tickers
+from config_setup import load_user_config, load_system_config, save_user_config, read_tickers, read_user_scores
 from config_setup import validate_max_delta, validate_dte_range_min, validate_dte_range_max, \
     validate_buying_power
-from data_fetch import is_market_open, fetch_option_chain
+from data_fetch import is_market_open, ensure_market_hours, fetch_chains, options_from_chain, rank_chains, option_sort_key, \
+    configure_base_urls, configure_ranking, ranking_limit, apply_quotes, requote_options, sort_all_options, \
+    unique_tickers
+from api_fixtures import configure_recording
+from rate_limiter import configure_rate_limits
+from earnings_cache import configure_earnings_cache
+from chain_store import configure_chain_store, get_chain_store
+from metrics import configure_metrics, get_metrics
+from scoring import SORTING_METHODS, DEFAULT_SORTING_METHOD, configure_scores, get_score, score_names, \
+    is_sorting_method
+from single_flight import configure_coalescing
+from profiles import MAIN_PROFILE, profile_names, profile_settings, set_profile_setting, fetch_window, \
+    ranking_dte_range, profile_errors
+from market_calendar import get_market_calendar, format_timedelta
+from options_view import OptionsView
+from refresh_scheduler import RefreshScheduler
 import logging
 
+# How often the streamed symbols are matched to the rows on screen, so scrolling is followed
+SUBSCRIPTION_SYNC_SECS = 1
+
 def format_option(option):
-    if "message" in option:
+    if option.message is not None:
         row1 = urwid.Text([('default', f"\n")])
-        row2 = urwid.Text([('default', option["message"])])
+        row2 = urwid.Text([('default', option.message)])
         row3 = urwid.Text([('default', f"\n")])
         return urwid.Pile([row1, row2, row3])
 
-    if option['put_call_ratio'] > 1.1:
+    if option.put_call_ratio > 1.1:
         put_call_emoji = '⚠️ '
-    elif option['put_call_ratio'] == 0.0:
+    elif option.put_call_ratio == 0.0:
         put_call_emoji = '0️⃣ '
-    elif option['put_call_ratio'] < 0.9:
+    elif option.put_call_ratio < 0.9:
         put_call_emoji = '✅ '
     else:
         put_call_emoji = '⚖️ '
 
     row1 = urwid.Text([
         ('default', f"\nTicker: "),
-        ('bright white', f"{option['ticker']} [{option['line_number']}], "),
+        ('bright white', f"{option.ticker} [{option.line_number}], "),
         ('default', f"Premium Total: "),
-        ('bright green,bold', f"${option['premium_usd']}, "),
-        ('default', f"(per day: ${option['premium_per_day']}), "),
+        ('bright green,bold', f"${option.premium_usd}, "),
+        ('default', f"(per day: ${option.premium_per_day}), "),
         ('default', f"ARR: "),
-        ('bright white', f"{option['arr']}%, "),
+        ('bright white', f"{option.arr}%, "),
         ('bright cyan', f"LIQ.: "),
         ('default', f"BidSize: "),
-        ('dark green', f"{option['bidSize']}, "),
+        ('dark green', f"{option.bid_size}, "),
         ('default', f"AskSize: "),
-        ('dark green', f"{option['askSize']}, "),
+        ('dark green', f"{option.ask_size}, "),
         ('default', f"Spread: "),
-        ('bright green,bold', f"{round(((option['ask'] - option['bid']) / option['ask']) * 100, 2)}%")
+        ('bright green,bold', f"{round(((option.ask - option.bid) / option.ask) * 100, 2)}%")
     ])
 
     row2 = urwid.Text([
         ('dark red', f"   RISK: "),
         ('default', f"PUT/CALL ratio: "),
-        ('bright white', f"{round(option['put_call_ratio'],2)} {put_call_emoji}, "),
+        ('bright white', f"{round(option.put_call_ratio,2)} {put_call_emoji}, "),
         ('default', f"Stock IV: "),
-        ('bright white', f"{option['underlying_iv']}, "),
+        ('bright white', f"{option.underlying_iv}, "),
         ('default', f"Delta: "),
-        ('bright white', f"{option['delta']}, "),
+        ('bright white', f"{option.delta}, "),
         ('default', f"Underlying price: $"),
-        ('dark green', f"{round(option['underlyingPrice'], 2)} "),
+        ('dark green', f"{round(option.underlying_price, 2)} "),
         ('bright white',
-         f"(d: ${round(option['underlyingPrice'] - option['strikePrice'], 2)} "
-         f"{round((option['underlyingPrice'] - option['strikePrice']) / option['underlyingPrice'], 2)}%), ")
+         f"(d: ${round(option.underlying_price - option.strike_price, 2)} "
+         f"{round((option.underlying_price - option.strike_price) / option.underlying_price, 2)}%), ")
     ])
 
     row3 = urwid.Text([
         ('bright white', f"   TRADE: "),
-        ('bright white,bold', f"{option['description']}, "),
+        ('bright white,bold', f"{option.description}, "),
         ('default', f"Strike Price: "),
-        ('bright white', f"${option['strikePrice']}, "),
+        ('bright white', f"${option.strike_price}, "),
         ('default', f"DTE: "),
-        ('bright white', f"{option['daysToExpiration']}, "),
+        ('bright white', f"{option.days_to_expiration}, "),
         ('default', f"No to open: "),
-        ('bright purple', f"{option['no_of_contracts_to_write']} @ ${option['bid']}"),
-        ('default', "⚠️ 📆") if option["has_earnings"] else ('default', "📵 📆") if not option["earnings_data_retrieved"] else (
+        ('bright purple', f"{option.no_of_contracts_to_write} @ ${option.bid}"),
+        ('default', "⚠️ 📆") if option.has_earnings else ('default', "📵 📆") if not option.earnings_data_retrieved else (
         'default', '')
     ])
 
     return urwid.Pile([row1, row2, row3])
 
+def footer_text(sorting_method, profile_count=1):
+    keys = "q: exit app, c: configuration setup, s: sort by (now: {} desc.), e: filter out stocks with earnings, " \
+           "p: performance stats, r: forced refresh".format(sorting_method)
+    if profile_count > 1:
+        keys += ", tab/1-{}: switch profile".format(min(profile_count, 9))
+    return urwid.Text([keys])
+
+def sorted_position(options, option, sort_key):
+    """Index at which option keeps a list ordered by sort_key descending (after equal keys)."""
+    key = sort_key(option)
+    low, high = 0, len(options)
+    while low < high:
+        middle = (low + high) // 2
+        if sort_key(options[middle]) < key:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+def stats_markup(metrics, ticker_rows=10):
+    """Text markup of the latency table per stage, the counters and the slowest tickers."""
+    lines = [('bright white', f"{'Stage':<16}{'count':>8}{'p50 ms':>11}{'p95 ms':>11}{'max ms':>11}{'total s':>10}\n")]
+    for stage, stats in sorted(metrics.stages().items()):
+        lines.append(('default', f"{stage:<16}{stats['count']:>8}{stats['p50_ms']:>11.1f}{stats['p95_ms']:>11.1f}"
+                                 f"{stats['max_ms']:>11.1f}{stats['total_secs']:>10.1f}\n"))
+
+    counters = metrics.counters()
+    if counters:
+        lines.append(('bright white', "\nCounters: "))
+        lines.append(('default', ", ".join(f"{name}={value}" for name, value in sorted(counters.items())) + "\n"))
+
+    hosts = metrics.hosts()
+    if hosts:
+        lines.append(('bright white', f"\n{'Host':<28}{'requests':>10}{'new conn.':>11}{'reuse':>8}{'retries':>9}"
+                                      f"{'wait s':>9}{'throttle s':>12}\n"))
+        for host, stats in sorted(hosts.items()):
+            lines.append(('default', f"{host:<28}{stats['requests']:>10}{stats['new_connections']:>11}"
+                                     f"{stats['reuse_ratio']:>8.2f}{stats['retries']:>9}{stats['wait_secs']:>9.1f}"
+                                     f"{stats['throttle_secs']:>12.1f}\n"))
+
+    slowest = metrics.tickers("chain", ticker_rows)
+    if slowest:
+        lines.append(('bright white', f"\n{'Slowest tickers':<16}{'chain p50':>11}{'chain p95':>11}"
+                                      f"{'earn. p50':>11}{'earn. p95':>11}\n"))
+        earnings = dict(metrics.tickers("earnings"))
+        for ticker, stats in slowest:
+            earnings_stats = earnings.get(ticker, {"p50_ms": 0.0, "p95_ms": 0.0})
+            lines.append(('default', f"{ticker:<16}{stats['p50_ms']:>11.1f}{stats['p95_ms']:>11.1f}"
+                                     f"{earnings_stats['p50_ms']:>11.1f}{earnings_stats['p95_ms']:>11.1f}\n"))
+    return lines
+
 class SortingOptions(urwid.WidgetWrap):
     def __init__(self, options, select_callback):
         self.select_callback = select_callback
@@ -95,20 +168,40 @@ class MainFrame(urwid.Frame):
         self.system_config = system_config
         self.tickers = tickers
         self.loop = loop
+        # Scan profile shown; all profiles are ranked from the same cached chains
+        self.profile = MAIN_PROFILE
         self.current_sorting_method = user_config["default_sorting_method"] if user_config else "arr"
         self.filter_earnings = False
         self.fetched_options = []
 
+        # Raw chains from the last fetch, so sorting and filters can be re-applied without API calls
+        self.chains = {}
+        self.chains_window = None
+        # Fetch time of the oldest cached chain
+        self.chains_fetched_at = None
+        self.market_calendar = get_market_calendar()
+        self.refresh_scheduler = RefreshScheduler(system_config["refresh_interval"],
+                                                  system_config.get("refresh_schedule"))
+        self.market_hours_requested_at = None
+
+        # Background refresh state; results are handed to the UI thread through a watch_pipe
+        self.refresh_generation = 0
+        self.refresh_cancel = None
+        self.refresh_progress = None
+        self.displayed_options = []
+        self.updates = queue.Queue()
+        self.update_pipe = None
+
+        # Performance overlay, toggled with 'p' and refreshed along with the list
+        self.stats_text = urwid.Text("")
+        self.stats_overlay = None
+
+        # Live quotes of the rows on screen, when streaming is configured
+        self.quote_stream = None
+
         # Create header_text and main_area here
-        self.header_text = urwid.Text([
-            ("header-bold", "ThetaTracker"),
-            ("header", " - "),
-            ("header", "Date: "), ("header-bold", datetime.now().strftime("%Y-%m-%d %H:%M")),
-            ("header", ", "),
-            ("header", "Buying Power: "), ("header-bold", f"${user_config['buying_power']}"),
-            ("header", ", "),
-            ("header", "Market: "), ("header-bold", "Open" if is_market_open(system_config["api_key"]) else "Closed")
-        ])
+        self.header_text = urwid.Text("")
+        self.refresh_header()
         header = urwid.AttrMap(self.header_text, "header")
         super().__init__(self.main_area, header=header, footer=footer)
         # Dictionary to store the validation functions
@@ -122,16 +215,16 @@ class MainFrame(urwid.Frame):
     def select_sorting_option(self, option):
         # This function is called when a sorting option is selected
         self.current_sorting_method = option
-        self.user_config["default_sorting_method"] = option
-        footer_text = urwid.Text([
-            "q: exit app, c: configuration setup, s: sort by (now: {} desc.), r: forced refresh".format(
-                self.current_sorting_method)
-        ])
-        footer_text = urwid.AttrMap(footer_text, "footer")
-        self.footer.original_widget = footer_text
+        set_profile_setting(self.user_config, self.profile, "default_sorting_method", option)
+        self.refresh_footer()
 
         # logging.debug(f'Sorting option changed to: {option}')
 
+        self.save_user_settings()
+
+        self.update_options()
+
+    def save_user_settings(self):
         # Create a copy of the user config and remove unwanted fields
         user_config_to_save = self.user_config.copy()
         user_config_to_save['max_delta'] = float(user_config_to_save['max_delta'])
@@ -144,11 +237,32 @@ class MainFrame(urwid.Frame):
 
         save_user_config(user_config_to_save)
 
-        self.refresh_data(self.tickers, self.user_config["from_date"], self.user_config["to_date"], option)
+    def ensure_sorting_method(self):
+        """Fall back to "arr" when the sorting method names a score that is gone or no longer compiles.
+
+        Returns True if the method had to be changed.
+        """
+        if is_sorting_method(self.current_sorting_method):
+            return False
+        logging.warning(f"Unknown sorting method {self.current_sorting_method}, sorting by {DEFAULT_SORTING_METHOD}")
+        self.current_sorting_method = DEFAULT_SORTING_METHOD
+        set_profile_setting(self.user_config, self.profile, "default_sorting_method", DEFAULT_SORTING_METHOD)
+        self.save_user_settings()
+        self.refresh_footer()
+        return True
 
     def create_sorting_widget(self):
-        # Create a list of sorting options
-        sorting_options = ["arr", "premium_usd", "premium_per_day", "delta"]
+        # Pick up scores added or tuned in the user config file since they were last read
+        scores = read_user_scores()
+        if scores is not None:
+            self.user_config["scores"] = scores
+            configure_scores(self.user_config)
+            if self.ensure_sorting_method():
+                # The list was ranked by a score that is gone
+                self.apply_filters()
+
+        # Create a list of sorting options, followed by the composite scores
+        sorting_options = list(SORTING_METHODS) + score_names()
 
         # Create a SortingOptions widget
         sorting_options_widget = SortingOptions(sorting_options, self.select_sorting_option)
@@ -160,7 +274,7 @@ class MainFrame(urwid.Frame):
         overlay = urwid.Overlay(framed_widget, self.body,
                                 align='center', width=('relative', 20),
                                 valign='middle', height=('relative', 10),
-                                min_width=20, min_height=9, top=-20)
+                                min_width=20, min_height=max(9, 2 * len(sorting_options) + 2), top=-20)
 
         # Return the created widget
         return overlay
@@ -178,10 +292,10 @@ class MainFrame(urwid.Frame):
             configuration_options = ["max_delta", "dte_range_min", "dte_range_max", "buying_power"]
 
             # Create a ConfigurationOptions widget
-            configuration_options_widget = ConfigurationOptions(configuration_options, self.select_configuration_option, self, self.user_config)
+            configuration_options_widget = ConfigurationOptions(configuration_options, self.select_configuration_option, self, self.settings())
 
             # Add a frame around the ConfigurationOptions widget
-            framed_widget = urwid.LineBox(configuration_options_widget, title="Edit User Configuration")
+            framed_widget = urwid.LineBox(configuration_options_widget, title=f"Edit Profile: {self.profile}")
 
             # Create an Overlay widget with the ConfigurationOptions widget on top of the current body
             overlay = urwid.Overlay(framed_widget, self.body,
@@ -198,6 +312,15 @@ class MainFrame(urwid.Frame):
         elif key == 'e':
             self.filter_earnings = not self.filter_earnings
             self.refresh_display()
+        elif key == 'p':
+            self.toggle_stats()
+        elif key == 'tab' and not isinstance(self.body, urwid.Overlay):
+            names = profile_names(self.user_config)
+            self.switch_profile(names[(names.index(self.profile) + 1) % len(names)])
+        elif len(key) == 1 and key in "123456789" and not isinstance(self.body, urwid.Overlay):
+            names = profile_names(self.user_config)
+            if int(key) <= len(names):
+                self.switch_profile(names[int(key) - 1])
         else:
             return super().keypress(size, key)
 
@@ -205,31 +328,230 @@ class MainFrame(urwid.Frame):
         # Switch back to the main screen
         self.set_body(self.main_area)
 
-    def refresh_data(self, tickers, from_date, to_date, sorting_method="arr"):
-        self.fetched_options = fetch_option_chain(
+    def attach_loop(self, loop):
+        self.loop = loop
+        self.update_pipe = loop.watch_pipe(self.process_updates)
+
+    def set_chains(self, chains, from_date, to_date, fetched_at=None):
+        self.chains = chains
+        self.chains_window = (from_date.date(), to_date.date())
+        self.chains_fetched_at = fetched_at or min((chain["fetched_at"] for chain in chains.values()),
+                                                   default=datetime.now())
+
+    def chains_max_age(self):
+        # Cold tickers are only refetched this often, so older chains are stale
+        return self.refresh_scheduler.longest_max_age(self.market_open())
+
+    def chains_are_stale(self, from_date, to_date):
+        if self.chains_fetched_at is None or self.chains_window != (from_date.date(), to_date.date()):
+            return True
+        age = (datetime.now() - self.chains_fetched_at).total_seconds()
+        return age > self.chains_max_age()
+
+    def update_options(self):
+        """Re-rank the cached chains, refetching only if the DTE window changed or the data is stale."""
+        from_date, to_date = self.user_config["from_date"], self.user_config["to_date"]
+        if self.chains_are_stale(from_date, to_date):
+            self.refresh_data(self.tickers, from_date, to_date)
+        else:
+            self.apply_filters()
+
+    def settings(self):
+        """The user settings of the profile shown."""
+        return profile_settings(self.user_config, self.profile)
+
+    def switch_profile(self, name):
+        """Show another profile's ranking of the cached chains. No API calls are made."""
+        if name == self.profile:
+            return
+        self.profile = name
+        self.current_sorting_method = self.settings()["default_sorting_method"]
+        self.refresh_footer()
+        self.ensure_sorting_method()
+        self.apply_filters()
+
+    def report_profile_errors(self):
+        errors = profile_errors(self.user_config)
+        for name, error in errors.items():
+            logging.error(f"Invalid profile {name}: {error}")
+        if errors:
+            self.show_error_message("Invalid profiles: " + "; ".join(f"{name}: {error}"
+                                                                    for name, error in errors.items()))
+
+    def apply_filters(self):
+        settings = self.settings()
+        self.fetched_options = rank_chains(self.chains.values(), settings["max_delta"], settings["buying_power"],
+                                           self.current_sorting_method,
+                                           dte_range=ranking_dte_range(self.user_config, self.profile))
+        self.refresh_display()
+
+    def refresh_data(self, tickers, from_date, to_date):
+        # Supersede any refresh still in flight; its results will be ignored
+        if self.refresh_cancel is not None:
+            self.refresh_cancel.set()
+        self.refresh_generation += 1
+        self.refresh_cancel = threading.Event()
+        self.refresh_progress = (0, len(tickers))
+
+        fetch_args = (
             self.system_config["api_key"],
-            tickers,
+            list(tickers),
             from_date,  # from_date passed as argument
             to_date,  # to_date passed as argument
-            self.user_config["max_delta"],
-            self.user_config["buying_power"],  # buying_power from user_config
-            sorting_method,
-            self.system_config["finnhub_api_key"]
-            )
-        self.refresh_display()
+            self.system_config["finnhub_api_key"],
+            self.system_config.get("fetch_backend", "threads")
+        )
 
-    def refresh_display(self):
-        displayed_options = [option for option in self.fetched_options if
-                             not (self.filter_earnings and option["has_earnings"])]
+        if self.update_pipe is None:
+            # No main loop to post back to yet, fetch in place
+            self.set_chains(fetch_chains(*fetch_args), from_date, to_date)
+            self.refresh_progress = None
+            self.apply_filters()
+            return
 
-        options_list = urwid.SimpleListWalker(
-            [format_option(option) for option in displayed_options] + [urwid.Divider('-')]
-        )
-        self.main_area = urwid.ListBox(options_list)
-        self.main_area = urwid.Pile([self.main_area])
+        worker = threading.Thread(target=self.refresh_worker,
+                                  args=(self.refresh_generation, self.refresh_cancel, fetch_args),
+                                  daemon=True)
+        worker.start()
         self.refresh_header()
+        self.loop.draw_screen()
+
+    def refresh_worker(self, generation, cancel_event, fetch_args):
+        """Runs in a background thread; never touches widgets directly."""
+        try:
+            chains = fetch_chains(
+                *fetch_args,
+                progress_callback=lambda done, total: self.post_update(generation, "progress", (done, total)),
+                cancel_event=cancel_event,
+                chain_callback=lambda ticker, chain: self.post_update(generation, "chain", (ticker, chain)))
+        except Exception as e:
+            logging.exception("Background refresh failed.")
+            self.post_update(generation, "error", str(e))
+            return
+        if cancel_event.is_set():
+            return
+
+        try:
+            # Only hits the API when the day has changed since the hours were last loaded
+            ensure_market_hours(self.system_config["api_key"])
+        except Exception:
+            logging.exception("Unable to load market hours.")
+        self.post_update(generation, "result", (chains, fetch_args[2], fetch_args[3]))
+
+    def post_update(self, generation, kind, payload):
+        self.updates.put((generation, kind, payload))
+        os.write(self.update_pipe, b"\n")
+
+    def process_updates(self, _data):
+        """Called by the main loop whenever the refresh worker posted something."""
+        while True:
+            try:
+                generation, kind, payload = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            if generation is not None and generation != self.refresh_generation:
+                continue  # stale refresh
+            if kind == "quotes":
+                self.merge_quotes(*payload)
+            elif kind == "progress":
+                self.refresh_progress = payload
+                self.refresh_header()
+            elif kind == "chain":
+                ticker, chain = payload
+                settings = self.settings()
+                options = [] if chain is None else options_from_chain(
+                    chain, settings["max_delta"], settings["buying_power"], self.current_sorting_method,
+                    dte_range=ranking_dte_range(self.user_config, self.profile))
+                self.merge_ticker_options(ticker, options)
+            elif kind == "result":
+                chains, from_date, to_date = payload
+                if self.chains_window == (from_date.date(), to_date.date()):
+                    # A scheduled refresh only fetches the tickers that were due, keep the others
+                    watched = {ticker for ticker, _ in self.tickers}
+                    chains = {ticker: chain for ticker, chain in {**self.chains, **chains}.items()
+                              if ticker in watched}
+                self.set_chains(chains, from_date, to_date)
+                self.refresh_progress = None
+                self.apply_filters()
+            elif kind == "error":
+                self.refresh_progress = None
+                self.refresh_header()
+                self.show_error_message(f"Refresh failed: {payload}")
+        return True
+
+    def merge_ticker_options(self, ticker, options):
+        """Replace one ticker's rows with freshly fetched options, keeping the list sorted."""
+        sort_key = option_sort_key(self.current_sorting_method)
+
+        self.fetched_options = [option for option in self.fetched_options if option.ticker != ticker]
+        for option in options:
+            self.fetched_options.insert(sorted_position(self.fetched_options, option, sort_key), option)
+        # Keep to the configured top_n; the ranking once the refresh completes brings in any options cut here
+        del self.fetched_options[ranking_limit() or len(self.fetched_options):]
+
+        self.refresh_display()
+
+    def attach_quote_stream(self, quote_stream):
+        self.quote_stream = quote_stream
+        self.sync_subscriptions(self.loop, None)
+
+    def post_quotes(self, option_quotes, underlying_prices):
+        # Called from the stream thread; quotes do not belong to any refresh
+        self.post_update(None, "quotes", (option_quotes, underlying_prices))
+
+    def sync_subscriptions(self, loop, _user_data):
+        options = self.main_area.visible_options()
+        self.quote_stream.subscribe([option.symbol for option in options], {option.ticker for option in options})
+        loop.set_alarm_in(SUBSCRIPTION_SYNC_SECS, self.sync_subscriptions)
+
+    def merge_quotes(self, option_quotes, underlying_prices):
+        """Update the rows with streamed quotes, keeping the list sorted. No API calls are made."""
+        # The cached chains get them too, so re-ranking before the next rescan keeps the live prices
+        apply_quotes(self.chains, option_quotes, underlying_prices)
+        if get_score(self.current_sorting_method) is not None:
+            # Composite scores are only computed on the chain tables
+            self.apply_filters()
+            return
+        settings = self.settings()
+        self.fetched_options = sort_all_options(
+            requote_options(self.fetched_options, option_quotes, underlying_prices, settings["buying_power"],
+                            settings["max_delta"]),
+            self.current_sorting_method)
+        self.refresh_display()
+
+    def refresh_display(self):
+        with get_metrics().span("render"):
+            self.displayed_options = [option for option in self.fetched_options if
+                                      not (self.filter_earnings and option.has_earnings)]
+            # Rows are formatted as they scroll into view, the list keeps its focus and scroll position
+            self.main_area.update(self.displayed_options)
+            self.refresh_header()
 
-        self.body = self.main_area
+            if isinstance(self.body, urwid.Overlay):
+                # Keep an open dialog on top of the refreshed list
+                self.body.bottom_w = self.main_area
+            else:
+                self.body = self.main_area
+            if self.body is self.stats_overlay:
+                self.stats_text.set_text(stats_markup(get_metrics()))
+            if self.loop is not None:
+                self.loop.draw_screen()
+
+    def toggle_stats(self):
+        if self.stats_overlay is not None and self.body is self.stats_overlay:
+            self.body = self.main_area
+            return
+        self.stats_text.set_text(stats_markup(get_metrics()))
+        framed_widget = urwid.LineBox(urwid.Filler(self.stats_text, valign='top'), title="Performance (p: close)")
+        self.stats_overlay = urwid.Overlay(framed_widget, self.main_area,
+                                           align='center', width=('relative', 80),
+                                           valign='middle', height=('relative', 80),
+                                           min_width=60, min_height=12)
+        self.body = self.stats_overlay
+
+    def refresh_footer(self):
+        self.footer = urwid.AttrMap(footer_text(self.current_sorting_method, len(profile_names(self.user_config))),
+                                    "footer")
         if self.loop is not None:
             self.loop.draw_screen()
 
@@ -239,51 +561,46 @@ class MainFrame(urwid.Frame):
             ("header", " - "),
             ("header", "Date: "), ("header-bold", datetime.now().strftime("%Y-%m-%d %H:%M")),
             ("header", ", "),
-            ("header", "Buying Power: "), ("header-bold", f"${self.user_config['buying_power']}"),
+            ("header", "Buying Power: "), ("header-bold", f"${self.settings()['buying_power']}"),
             ("header", ", "),
-            ("header", "Market: "), ("header-bold", "Open" if is_market_open(self.system_config["api_key"]) else "Closed")
-        ])
-
-    def apply_config(self, new_config, tickers):
-        # Update the user_config
-        self.user_config = new_config
-        self.tickers = tickers
-
-        # Recalculate from_date and to_date
-        from_date = datetime.now() + timedelta(new_config["dte_range_min"])
-        to_date = datetime.now() + timedelta(new_config["dte_range_max"])
-
-        new_config["from_date"] = from_date
-        new_config["to_date"] = to_date
-
-        # Fetch new options
-        options = fetch_option_chain(
-            self.system_config["api_key"],
-            self.tickers,
-            from_date,
-            to_date,
-            new_config["max_delta"],
-            new_config["buying_power"],
-            new_config["default_sorting_method"],
-            self.system_config["finnhub_api_key"]
-        )
-
-        # Update the options list
-        options_list = urwid.SimpleListWalker(
-            [format_option(option) for option in options] + [urwid.Divider('-')]
-        )
-        self.main_area = urwid.ListBox(options_list)
-        self.main_area = urwid.Pile([self.main_area])
-        self.body = self.main_area  # If main_area is indeed the body
-
-        # Update the footer text
-        footer_text = urwid.Text([
-            "q: exit app, c: configuration setup, s: sort by (now: {} desc.), e: filter out stocks with earnings, r: forced refresh".format(
-                new_config["default_sorting_method"])
-        ])
-        self.footer = urwid.AttrMap(footer_text, "footer")
-        if self.loop is not None:
-            self.loop.draw_screen()
+            ("header", "Market: "), ("header-bold", self.market_status())
+        ] + self.staleness_markup() + self.progress_markup() + self.profiles_markup())
+
+    def market_status(self):
+        # Answered from the cached session hours, no network I/O
+        time_to_close = self.market_calendar.time_to_close()
+        if time_to_close is not None:
+            return f"Open (closes in {format_timedelta(time_to_close)})"
+        time_to_open = self.market_calendar.time_to_open()
+        if time_to_open is not None:
+            return f"Closed (opens in {format_timedelta(time_to_open)})"
+        return "Closed"
+
+    def staleness_markup(self):
+        # Shown while the list comes from an old snapshot or refreshes have been failing
+        if self.chains_fetched_at is None:
+            return []
+        age = datetime.now() - self.chains_fetched_at
+        if age.total_seconds() <= self.chains_max_age():
+            return []
+        return [("header", ", "), ("header-bold", f"Stale: {format_timedelta(age)} old")]
+
+    def profiles_markup(self):
+        # Tabs of the profiles on a second line, the one shown highlighted
+        names = profile_names(self.user_config)
+        if len(names) == 1:
+            return []
+        markup = [("header", "\nProfiles:")]
+        for number, name in enumerate(names, start=1):
+            markup.append(("header", " "))
+            markup.append(("header-bold", f"[{number}:{name}]") if name == self.profile else ("header", f" {number}:{name} "))
+        return markup
+
+    def progress_markup(self):
+        if self.refresh_progress is None:
+            return []
+        done, total = self.refresh_progress
+        return [("header", ", "), ("header-bold", f"Refreshing… {done}/{total} tickers")]
 
     def select_configuration_option(self, option, edit_widget):
         # Update the selected configuration option with the new value
@@ -306,51 +623,90 @@ class MainFrame(urwid.Frame):
             validate_func = self.validation_functions[option]
 
             if option == "dte_range_max":
-                dte_range_min = self.user_config["dte_range_min"]
+                dte_range_min = self.settings()["dte_range_min"]
                 is_valid, error_message = validate_func(dte_range_min, new_value)
                 if not is_valid:
                     self.show_error_message(error_message)
                     return
+            elif option == "dte_range_min" and validate_func(new_value)[0]:
+                # A minimum above the maximum would leave the profile without expirations
+                is_valid, error_message = validate_dte_range_max(new_value, self.settings()["dte_range_max"])
+                if not is_valid:
+                    self.show_error_message(error_message)
+                    return
             else:
                 is_valid, error_message = validate_func(new_value)
                 if not is_valid:
                     self.show_error_message(error_message)
                     return
 
-        # If the new value is valid, update the user config and save it
-        self.user_config[option] = new_value
+        # If the new value is valid, update the profile shown and save the user config
+        set_profile_setting(self.user_config, self.profile, option, new_value)
+        self.save_user_settings()
 
-        # Create a copy of the user config and remove unwanted fields
-        user_config_to_save = self.user_config.copy()
-        user_config_to_save['max_delta'] = float(user_config_to_save['max_delta'])
-        user_config_to_save['dte_range_min'] = int(user_config_to_save['dte_range_min'])
-        user_config_to_save['dte_range_max'] = int(user_config_to_save['dte_range_max'])
-        user_config_to_save['buying_power'] = float(user_config_to_save['buying_power'])
-        user_config_to_save.pop('from_date', None)
-        user_config_to_save.pop('to_date', None)
-
-        save_user_config(user_config_to_save)
-
-        # Update the footer text
-        footer_text = urwid.Text([
-            "q: exit app, c: configuration setup, s: sort by (now: {} desc.), r: forced refresh".format(
-                user_config_to_save["default_sorting_method"])
-        ])
-        self.footer = urwid.AttrMap(footer_text, "footer")
-        if self.loop is not None:
-            self.loop.draw_screen()
+        self.refresh_footer()
 
         # Return to the main window
         self.body = self.body[0]
 
+        if option in ("dte_range_min", "dte_range_max"):
+            self.user_config["from_date"], self.user_config["to_date"] = fetch_window(self.user_config)
+        # Delta and buying power changes are applied to the cached chains, a new DTE window is refetched
+        self.update_options()
+
     def refresh_content(self, loop, user_data):
-        from_date = user_data['from_date']  # get from user_data
-        to_date = user_data['to_date']  # get from user_data
+        # The DTE window may have been changed in the app since the alarm was first set
+        from_date = self.user_config.get("from_date", user_data['from_date'])
+        to_date = self.user_config.get("to_date", user_data['to_date'])
         tickers = user_data['tickers']
-        self.refresh_data(tickers, from_date, to_date)
+        if self.chains_window == (from_date.date(), to_date.date()):
+            # Only refetch the tickers whose chains are due, as hot tickers go stale sooner
+            tickers = self.refresh_scheduler.due_tickers(tickers, self.chains, self.hot_tickers(), self.market_open())
+        if tickers:
+            self.refresh_data(tickers, from_date, to_date)
+        else:
+            # Every chain is still within its max age; they keep their own fetch times
+            self.refresh_header()
         # Set another alarm. The same user_data will be used again.
         loop.set_alarm_in(self.system_config['refresh_interval'], self.refresh_content, user_data=user_data)
 
+    def hot_tickers(self):
+        """Tickers that are hot in the ranking of any profile, each judged by its own max_delta."""
+        hot = set()
+        for name in profile_names(self.user_config):
+            settings = profile_settings(self.user_config, name)
+            if name == self.profile:
+                options = self.fetched_options
+            else:
+                options = rank_chains(self.chains.values(), settings["max_delta"], settings["buying_power"],
+                                      settings["default_sorting_method"],
+                                      dte_range=ranking_dte_range(self.user_config, name))
+            hot |= self.refresh_scheduler.hot_tickers(options, float(settings["max_delta"]))
+        return hot
+
+    def market_open(self):
+        """Answered from the cached session hours; the market counts as closed until today's are loaded."""
+        if not self.market_calendar.has_sessions():
+            self.load_market_hours()
+        return self.market_calendar.is_open()
+
+    def load_market_hours(self):
+        # After midnight no refresh may be due for hours, so the new day's hours are loaded here,
+        # trying again at most once per refresh interval
+        now = datetime.now()
+        if self.market_hours_requested_at is not None and \
+                (now - self.market_hours_requested_at).total_seconds() < self.system_config["refresh_interval"]:
+            return
+        self.market_hours_requested_at = now
+        threading.Thread(target=self.market_hours_worker, daemon=True).start()
+
+    def market_hours_worker(self):
+        """Runs in a background thread; never touches widgets directly."""
+        try:
+            ensure_market_hours(self.system_config["api_key"])
+        except Exception:
+            logging.exception("Unable to load market hours.")
+
     def show_error_message(self, error_message):
         # Create a new text widget with the error message
         error_text = urwid.Text(error_message)
@@ -425,7 +781,7 @@ class ConfigSetup(urwid.WidgetWrap):
             return
 
         # Check if sorting_method is a valid value
-        valid_sorting_methods = ["premium_usd", "premium_per_day", "delta", "arr"]
+        valid_sorting_methods = list(SORTING_METHODS) + score_names()
         if sorting_method not in valid_sorting_methods:
             # The sorting method is not valid
             self.error_message.set_text("Invalid input: Sorting method must be one of: " + ", ".join(valid_sorting_methods))
@@ -498,25 +854,49 @@ def main():
     # Load the user and system configurations
     system_config = load_system_config()
     user_config = load_user_config()
-    tickers = read_tickers(file_path)
+    # A ticker listed twice is fetched and shown once
+    tickers = unique_tickers(read_tickers(file_path))
+    configure_scores(user_config)
 
     logging.basicConfig(filename='debug.log', level=logging.WARNING)
+    configure_base_urls(system_config)
+    configure_recording(system_config)
+    configure_rate_limits(system_config)
+    configure_earnings_cache(system_config)
+    configure_chain_store(system_config)
+    configure_metrics(system_config)
+    configure_ranking(system_config)
+    configure_coalescing(system_config)
+
+    if not is_sorting_method(user_config["default_sorting_method"]):
+        # E.g. a score that was removed from the config or no longer compiles
+        logging.warning(f"Unknown sorting method {user_config['default_sorting_method']}, "
+                        f"sorting by {DEFAULT_SORTING_METHOD}")
+        user_config["default_sorting_method"] = DEFAULT_SORTING_METHOD
+        save_user_config(user_config)
 
     # Check if the market is open
     is_open = is_market_open(system_config["api_key"])
     if not is_open:
         print("The market is currently closed.")
 
-    from_date = datetime.now() + timedelta(days=user_config["dte_range_min"])
-    to_date = datetime.now() + timedelta(days=user_config["dte_range_max"])
+    streaming = system_config.get("streaming", {})
+    if streaming.get("url"):
+        # Streamed quotes keep the rows on screen current, so full chains are rescanned much less often
+        system_config = dict(system_config, refresh_interval=streaming.get("rescan_interval",
+                                                                           system_config["refresh_interval"] * 10))
+
+    # One fetch serves every profile, so it covers the union of their DTE windows
+    from_date, to_date = fetch_window(user_config)
 
     user_config["from_date"] = from_date
     user_config["to_date"] = to_date
 
-    print("Loading options...")
-    options = fetch_option_chain(system_config["api_key"], tickers, from_date, to_date,
-                                 user_config["max_delta"], user_config["buying_power"],
-                                 user_config["default_sorting_method"], system_config["finnhub_api_key"])
+    # Start from the last snapshot, the first refresh runs in the background once the loop is up
+    chains = get_chain_store().load(tickers)
+    options = rank_chains(chains.values(), user_config["max_delta"], user_config["buying_power"],
+                          user_config["default_sorting_method"],
+                          dte_range=ranking_dte_range(user_config, MAIN_PROFILE))
 
     palette = [
         ("header", "white", "dark red"),
@@ -534,22 +914,25 @@ def main():
     ]
 
     # Create the main area
-    options_list = urwid.SimpleListWalker(
-        [format_option(option) for option in options] + [urwid.Divider('-')]
-    )
-    main_area = urwid.ListBox(options_list)
-    main_area = urwid.Pile([main_area])
+    main_area = OptionsView(format_option)
 
-    footer_text = urwid.Text([
-        "q: exit app, c: configuration setup, s: sort by (now: {} desc.), r: forced refresh".format(user_config["default_sorting_method"])
-    ])
-    footer = urwid.AttrMap(footer_text, "footer")
+    footer = urwid.AttrMap(footer_text(user_config["default_sorting_method"], len(profile_names(user_config))),
+                           "footer")
 
     # Create the layout
     layout = MainFrame(main_area, footer=footer, user_config=user_config, system_config=system_config, tickers=tickers)
     layout.fetched_options = options
+    if chains:
+        layout.set_chains(chains, from_date, to_date,
+                          fetched_at=min(chain["fetched_at"] for chain in chains.values()))
+    layout.refresh_display()
+    layout.report_profile_errors()
     loop = urwid.MainLoop(layout, palette=palette)
-    layout.loop = loop
+    layout.attach_loop(loop)
+    if streaming.get("url"):
+        # Imported lazily so running without streaming does not require aiohttp
+        from quote_stream import create_quote_stream
+        layout.attach_quote_stream(create_quote_stream(system_config, layout.post_quotes))
 
     loop.set_alarm_in(
         system_config['refresh_interval'],
@@ -563,9 +946,13 @@ def main():
     if not config:
         layout.show_user_config_widget(loop, save_user_config)
     else:
-        loop.set_alarm_in(0, lambda loop, _: layout.apply_config(user_config, tickers))
+        loop.set_alarm_in(0, lambda loop, _: layout.refresh_data(tickers, from_date, to_date))
     # Run the main loop
     loop.run()
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["scan"]:
+        # Headless mode, no terminal UI
+        from scan import main as scan_main
+        sys.exit(scan_main(sys.argv[2:]))
     main()
\ No newline at end of file
@@ -0,0 +1,112 @@
+import json
+import logging
+import threading
+from datetime import datetime
+
+from dateutil.parser import parse
+
+MARKET_HOURS_CACHE_PATH = "market_hours_cache.json"
+# Days of session hours kept in the cache file
+MAX_CACHED_DAYS = 7
+
+
+class MarketCalendar:
+    """Regular session hours per day, answering open/closed questions without network I/O.
+
+    Sessions are loaded once per day (see data_fetch.ensure_market_hours) and kept in memory
+    and in a small JSON file so restarts on the same day do not hit the hours endpoint.
+    """
+
+    def __init__(self, path=MARKET_HOURS_CACHE_PATH):
+        self.path = path
+        self._sessions = {}  # "YYYY-MM-DD" -> [(start, end), ...]
+        self._lock = threading.Lock()
+        self._load()
+
+    def has_sessions(self, day=None):
+        with self._lock:
+            return self._day_key(day) in self._sessions
+
+    def set_sessions(self, day, sessions):
+        """Store the (start, end) pairs of a day; an empty list means the market does not open."""
+        with self._lock:
+            self._sessions[self._day_key(day)] = sorted(sessions)
+            for old_day in sorted(self._sessions)[:-MAX_CACHED_DAYS]:
+                del self._sessions[old_day]
+            self._save()
+
+    def is_open(self, now=None):
+        return self.current_session(now) is not None
+
+    def current_session(self, now=None):
+        for start, end in self._sessions_for(now):
+            current = now or datetime.now(start.tzinfo)  # ensures the current time is timezone aware
+            if start <= current <= end:
+                return start, end
+        return None
+
+    def time_to_open(self, now=None):
+        """Time until the next session starts today, or None if there is none (or it is open)."""
+        if self.is_open(now):
+            return None
+        for start, _ in self._sessions_for(now):
+            current = now or datetime.now(start.tzinfo)
+            if current < start:
+                return start - current
+        return None
+
+    def time_to_close(self, now=None):
+        session = self.current_session(now)
+        if session is None:
+            return None
+        end = session[1]
+        return end - (now or datetime.now(end.tzinfo))
+
+    def _sessions_for(self, now):
+        with self._lock:
+            return list(self._sessions.get(self._day_key(now), []))
+
+    @staticmethod
+    def _day_key(day):
+        return (day or datetime.now()).strftime('%Y-%m-%d')
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r") as f:
+                cached = json.load(f)
+            self._sessions = {day: [(parse(start), parse(end)) for start, end in sessions]
+                              for day, sessions in cached.items()}
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable market hours cache {self.path}: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "w") as f:
+                json.dump({day: [(start.isoformat(), end.isoformat()) for start, end in sessions]
+                           for day, sessions in self._sessions.items()}, f)
+        except IOError:
+            logging.error(f"Error: Unable to write market hours cache {self.path}")
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_market_calendar():
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            _calendar = MarketCalendar()
+        return _calendar
+
+
+def format_timedelta(delta):
+    minutes = int(delta.total_seconds() // 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m"
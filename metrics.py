@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+METRICS_PATH = "metrics.jsonl"
+DEFAULT_FORMAT = "jsonl"
+DEFAULT_MAX_BYTES = 1_000_000
+DEFAULT_BACKUP_COUNT = 3
+# Percentiles are computed over the most recent samples of each stage and of each ticker
+DEFAULT_WINDOW = 500
+DEFAULT_TICKER_WINDOW = 20
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    index = max(0, min(len(sorted_samples) - 1, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+class StageStats:
+    __slots__ = ("samples", "count", "total_secs")
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total_secs = 0.0
+
+    def add(self, secs):
+        self.samples.append(secs)
+        self.count += 1
+        self.total_secs += secs
+
+    def as_dict(self):
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "total_secs": round(self.total_secs, 3),
+            "p50_ms": round(percentile(ordered, 0.5) * 1000, 2) if ordered else 0.0,
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 2) if ordered else 0.0,
+            "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        }
+
+
+class Metrics:
+    """Timing spans and counters of the fetch -> filter -> render pipeline, kept in memory.
+
+    Spans are recorded per stage ("chain", "parse", "earnings", "filter", "render", ...) and, when a
+    ticker is given, per ticker as well. Counters add up things like retries and seconds slept.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, ticker_window=DEFAULT_TICKER_WINDOW):
+        self.window = window
+        self.ticker_window = ticker_window
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._tickers = {}  # (stage, ticker) -> StageStats
+        self._counters = {}
+        self._hosts = {}  # host -> HTTP client stats, see http_client.HostStats
+        self.started_at = datetime.now()
+
+    def observe(self, stage, secs, ticker=None):
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats(self.window)
+            stats.add(secs)
+            if ticker is not None:
+                stats = self._tickers.get((stage, ticker))
+                if stats is None:
+                    stats = self._tickers[(stage, ticker)] = StageStats(self.ticker_window)
+                stats.add(secs)
+
+    @contextmanager
+    def span(self, stage, ticker=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, ticker)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def stages(self):
+        """{stage: {count, total_secs, p50_ms, p95_ms, max_ms}}"""
+        with self._lock:
+            return {stage: stats.as_dict() for stage, stats in self._stages.items()}
+
+    def tickers(self, stage, limit=None):
+        """[(ticker, stats)] of one stage, slowest p95 first."""
+        with self._lock:
+            rows = [(ticker, stats.as_dict()) for (name, ticker), stats in self._tickers.items() if name == stage]
+        rows.sort(key=lambda row: row[1]["p95_ms"], reverse=True)
+        return rows[:limit] if limit is not None else rows
+
+    def set_hosts(self, hosts):
+        with self._lock:
+            self._hosts = {host: dict(stats) for host, stats in hosts.items()}
+
+    def hosts(self):
+        """{host: {requests, new_connections, reuse_ratio, retries, wait_secs, throttle_secs}}"""
+        with self._lock:
+            return {host: dict(stats) for host, stats in self._hosts.items()}
+
+    def counters(self):
+        with self._lock:
+            return {name: round(value, 3) if isinstance(value, float) else value
+                    for name, value in self._counters.items()}
+
+    def snapshot(self):
+        return {"time": datetime.now().isoformat(timespec="seconds"), "stages": self.stages(),
+                "counters": self.counters(), "hosts": self.hosts()}
+
+    def prometheus_text(self):
+        """The current metrics in the Prometheus text exposition format."""
+        with self._lock:
+            stages = [(stage, sorted(stats.samples), stats.count, stats.total_secs)
+                      for stage, stats in self._stages.items()]
+            counters = dict(self._counters)
+            hosts = {host: dict(stats) for host, stats in self._hosts.items()}
+        lines = ["# TYPE thetatracker_stage_seconds summary"]
+        for stage, ordered, count, total_secs in sorted(stages):
+            for quantile in (0.5, 0.95):
+                value = percentile(ordered, quantile) if ordered else 0.0
+                lines.append(f'thetatracker_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'thetatracker_stage_seconds_sum{{stage="{stage}"}} {total_secs:.6f}')
+            lines.append(f'thetatracker_stage_seconds_count{{stage="{stage}"}} {count}')
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE thetatracker_{name}_total counter")
+            lines.append(f"thetatracker_{name}_total {value}")
+        for field in sorted({field for stats in hosts.values() for field in stats}):
+            lines.append(f"# TYPE thetatracker_host_{field} gauge")
+            for host, stats in sorted(hosts.items()):
+                if field in stats:
+                    lines.append(f'thetatracker_host_{field}{{host="{host}"}} {stats[field]}')
+        return "\n".join(lines) + "\n"
+
+
+_metrics = Metrics()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class MetricsWriter:
+    """Writes metrics snapshots either as JSON lines to a rotating file or as a Prometheus text file."""
+
+    def __init__(self, path=METRICS_PATH, file_format=DEFAULT_FORMAT, max_bytes=DEFAULT_MAX_BYTES,
+                 backup_count=DEFAULT_BACKUP_COUNT):
+        self.path = path
+        self.file_format = file_format
+        self._logger = None
+        if file_format == "jsonl":
+            self._logger = logging.getLogger("thetatracker.metrics")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+                handler.close()
+            self._logger.addHandler(RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                                delay=True))
+
+    def write(self, metrics):
+        try:
+            if self._logger is not None:
+                self._logger.info(json.dumps(metrics.snapshot()))
+            else:
+                # Scrapers must never see a half-written file
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, "w") as f:
+                    f.write(metrics.prometheus_text())
+                os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.error(f"Error: Unable to write metrics to {self.path}: {e}")
+
+    def close(self):
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+                handler.close()
+
+
+def configure_metrics(system_config):
+    """Apply the optional "metrics" section of the system config; an empty path disables the file."""
+    global _writer
+    settings = system_config.get("metrics", {}) if system_config else {}
+    path = settings.get("path", METRICS_PATH)
+    file_format = settings.get("format", DEFAULT_FORMAT)
+    if file_format not in ("jsonl", "prometheus"):
+        logging.error(f"Invalid metrics format {file_format}, using {DEFAULT_FORMAT}")
+        file_format = DEFAULT_FORMAT
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = MetricsWriter(path, file_format, int(settings.get("max_bytes", DEFAULT_MAX_BYTES)),
+                                int(settings.get("backup_count", DEFAULT_BACKUP_COUNT))) if path else None
+
+
+def get_metrics():
+    return _metrics
+
+
+def span(stage, ticker=None):
+    return _metrics.span(stage, ticker)
+
+
+def count(name, value=1):
+    _metrics.count(name, value)
+
+
+def write_metrics():
+    """Save a snapshot to the metrics file, if configure_metrics set one up."""
+    with _writer_lock:
+        if _writer is not None:
+            _writer.write(_metrics)
@@ -0,0 +1,90 @@
+from operator import itemgetter
+
+
+class OptionRecord:
+    """A put option reduced to the fields ThetaTracker uses.
+
+    Contract fields are filled from the API at parse time; the scores and ticker details are
+    filled in on a copy when the option is selected for display, so cached chains never change.
+    """
+
+    # API field name -> attribute, for the contract fields read from the chain response
+    API_FIELDS = {
+        "symbol": "symbol",
+        "description": "description",
+        "bid": "bid",
+        "ask": "ask",
+        "bidSize": "bid_size",
+        "askSize": "ask_size",
+        "delta": "delta",
+        "volatility": "volatility",
+        "totalVolume": "total_volume",
+        "openInterest": "open_interest",
+        "strikePrice": "strike_price",
+        "daysToExpiration": "days_to_expiration",
+    }
+    # score is the value of the sorting method the option was selected by, e.g. a composite score
+    SCORE_FIELDS = ("underlying_price", "put_call_ratio", "no_of_contracts_to_write", "premium_usd",
+                    "premium_per_day", "arr", "score", "message", "ticker", "line_number", "has_earnings",
+                    "earnings_data_retrieved")
+
+    __slots__ = tuple(API_FIELDS.values()) + SCORE_FIELDS
+
+    def __init__(self, symbol, description, bid, ask, bid_size, ask_size, delta, volatility, total_volume,
+                 open_interest, strike_price, days_to_expiration):
+        self.symbol = symbol
+        self.description = description
+        self.bid = bid
+        self.ask = ask
+        self.bid_size = bid_size
+        self.ask_size = ask_size
+        self.delta = delta
+        self.volatility = volatility
+        self.total_volume = total_volume
+        self.open_interest = open_interest
+        self.strike_price = strike_price
+        self.days_to_expiration = days_to_expiration
+        self.underlying_price = None
+        self.put_call_ratio = None
+        self.no_of_contracts_to_write = None
+        self.premium_usd = None
+        self.premium_per_day = None
+        self.arr = None
+        self.score = None
+        self.message = None
+        self.ticker = None
+        self.line_number = None
+        self.has_earnings = False
+        self.earnings_data_retrieved = False
+
+    @classmethod
+    def from_api(cls, option):
+        """Build a record from an option dict of the chain response; missing fields become None."""
+        return cls(*api_values(option))
+
+    def copy(self):
+        record = OptionRecord.__new__(OptionRecord)
+        for field in self.__slots__:
+            setattr(record, field, getattr(self, field))
+        return record
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @property
+    def underlying_iv(self):
+        return self.volatility
+
+    def __repr__(self):
+        return f"OptionRecord({self.symbol!r})"
+
+
+_api_values = itemgetter(*OptionRecord.API_FIELDS)
+
+
+def api_values(option):
+    """The contract fields of a chain response option as a tuple in argument order; missing ones are None."""
+    try:
+        return _api_values(option)
+    except KeyError:
+        return tuple(map(option.get, OptionRecord.API_FIELDS))
@@ -0,0 +1,214 @@
+import math
+from operator import attrgetter
+
+import numpy as np
+
+import scoring
+from option_record import OptionRecord, api_values
+from top_options import option_sort_key
+
+# Number of options kept per ticker
+TOP_OPTIONS_PER_TICKER = 5
+# Sorting methods that can be ranked on the columns
+SCORE_COLUMNS = ("no_of_contracts_to_write", "premium_usd", "premium_per_day", "arr", "delta")
+# Streamed quote fields and the columns that mirror them
+QUOTE_COLUMNS = {"bid": "bid", "ask": "ask", "delta": "delta", "total_volume": "volume",
+                 "open_interest": "open_interest", "bid_size": "bid_size", "ask_size": "ask_size",
+                 "volatility": "volatility"}
+# Record fields flattened into the columns
+COLUMN_FIELDS = ("strike_price", "bid", "ask", "delta", "days_to_expiration", "total_volume", "open_interest",
+                 "bid_size", "ask_size", "volatility")
+_column_values = attrgetter(*COLUMN_FIELDS)
+_record_api_values = attrgetter(*OptionRecord.API_FIELDS.values())
+# Where the columns are found in the api_values of an option
+_COLUMN_POSITIONS = [list(OptionRecord.API_FIELDS.values()).index(field) for field in COLUMN_FIELDS]
+
+
+def score_option(option, buying_power):
+    """Fill in the contract count, premium, premium per day and ARR of a record, as shown in the UI."""
+    option.no_of_contracts_to_write = math.floor(buying_power / (float(option.strike_price) * 100))
+    option.message = "Not enough buying power" if option.no_of_contracts_to_write < 1 else None
+    option.premium_usd = round(option.no_of_contracts_to_write * float(option.bid) * 100, 2)
+    option.premium_per_day = round(option.premium_usd / option.days_to_expiration
+                                   if option.days_to_expiration != 0 else
+                                   option.premium_usd, 2)
+    option.arr = round(option.premium_usd / buying_power * 365
+                       / max(int(option.days_to_expiration), 1) * 100, 3)
+    return option
+
+
+def _column(values):
+    try:
+        return np.fromiter(values, dtype=float, count=len(values))
+    except TypeError:
+        # Missing values (None) become NaN
+        return np.array(values, dtype=float)
+
+
+class OptionTable:
+    """The puts of one option chain flattened into NumPy columns.
+
+    The OptionRecords are kept alongside the columns only to build the few rows that end up
+    being displayed; filtering and scoring run on the columns. A table made of the options'
+    api_values keeps those tuples and builds records of them on first use of `records`.
+    """
+
+    def __init__(self, records, underlying_price, put_call_ratio, values=None):
+        """records, or with records None, the api_values of the options."""
+        self._records = records
+        self._values = values
+        self.underlying_price = underlying_price
+        self.put_call_ratio = put_call_ratio
+        if records is not None:
+            columns = list(zip(*map(_column_values, records)))
+        else:
+            api_columns = list(zip(*values))
+            columns = [api_columns[position] for position in _COLUMN_POSITIONS] if api_columns else []
+        if not columns:
+            columns = [()] * len(COLUMN_FIELDS)
+        strike, bid, ask, delta, dte, volume, open_interest, bid_size, ask_size, volatility = map(_column, columns)
+        for counts in (dte, volume, open_interest):
+            counts[np.isnan(counts)] = 0
+        self.strike = strike
+        self.bid = bid
+        self.ask = ask
+        self.delta = np.abs(delta)
+        self.dte = dte.astype(np.int64)
+        self.volume = volume
+        self.open_interest = open_interest
+        self.bid_size = bid_size
+        self.ask_size = ask_size
+        self.volatility = volatility
+        self._positions = None
+
+    @classmethod
+    def from_api_values(cls, values, underlying_price, put_call_ratio):
+        return cls(None, underlying_price, put_call_ratio, values)
+
+    @classmethod
+    def from_chain(cls, data, put_call_ratio):
+        put_exp_date_map = data.get("putExpDateMap", {})
+        values = [api_values(option)
+                  for date in put_exp_date_map
+                  for strike_price in put_exp_date_map[date]
+                  for option in put_exp_date_map[date][strike_price]]
+        return cls.from_api_values(values, data.get("underlyingPrice"), put_call_ratio)
+
+    @property
+    def records(self):
+        if self._records is None:
+            self._records = [OptionRecord(*values) for values in self._values]
+            self._values = None
+        return self._records
+
+    def api_values(self):
+        """The api_values of every option, without building records for them."""
+        if self._records is None:
+            return self._values
+        return [_record_api_values(record) for record in self._records]
+
+    def __len__(self):
+        return len(self.strike)
+
+    def apply_quotes(self, quotes, underlying_price=None):
+        """Apply streamed {symbol: {field: value}} quotes to the matching options; returns how many matched.
+
+        Records are replaced by updated copies, so options already built from them keep their values.
+        """
+        if self._positions is None:
+            self._positions = {record.symbol: index for index, record in enumerate(self.records)}
+        if underlying_price is not None:
+            self.underlying_price = underlying_price
+        matched = 0
+        for symbol, values in quotes.items():
+            index = self._positions.get(symbol)
+            if index is None:
+                continue
+            record = self.records[index] = self.records[index].copy()
+            for field, value in values.items():
+                setattr(record, field, value)
+                column = QUOTE_COLUMNS.get(field)
+                if column is not None:
+                    getattr(self, column)[index] = abs(value) if field == "delta" else value
+            matched += 1
+        return matched
+
+    def score_columns(self, buying_power):
+        """Contract count, premium, premium per day and ARR for every option, as arrays."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            contracts = np.floor(buying_power / (self.strike * 100))
+        contracts[~np.isfinite(contracts)] = 0
+        premium_usd = (contracts * self.bid * 100).round(2)
+        days = np.where(self.dte != 0, self.dte, 1)
+        return {
+            "no_of_contracts_to_write": contracts,
+            "premium_usd": premium_usd,
+            "premium_per_day": (premium_usd / days).round(2),
+            "arr": (premium_usd / buying_power * 365 / days * 100).round(3),
+            "delta": self.delta,
+        }
+
+    def sort_values(self, buying_power, sorting_method):
+        """The sort key of every option for a score column or a composite score; None for other methods."""
+        columns = self.score_columns(buying_power)
+        if sorting_method in SCORE_COLUMNS:
+            return columns[sorting_method]
+        score = scoring.get_score(sorting_method)
+        return score(self, columns) if score is not None else None
+
+    def candidates(self, max_delta, dte_range=None):
+        """Indices of the options within the delta range and, if given, the (min, max) DTE range."""
+        selected = self.delta <= max_delta
+        if dte_range is not None:
+            selected &= (self.dte >= dte_range[0]) & (self.dte <= dte_range[1])
+        return np.flatnonzero(selected)
+
+    def top_indices(self, max_delta, buying_power, sorting_method, limit=TOP_OPTIONS_PER_TICKER, above=None,
+                    values=None, dte_range=None):
+        """Indices of the best `limit` options within the delta and DTE ranges, best first.
+
+        With above given, only options scoring higher than it are considered. values are the
+        sort_values, if already computed.
+        """
+        candidates = self.candidates(max_delta, dte_range)
+        if candidates.size == 0:
+            return candidates
+        if values is None:
+            values = self.sort_values(buying_power, sorting_method)
+        key = values[candidates]
+        if above is not None:
+            better = key > above
+            candidates, key = candidates[better], key[better]
+        if limit is not None and candidates.size > limit:
+            best = np.argpartition(-key, limit - 1)[:limit]
+            candidates, key = candidates[best], key[best]
+        # Stable: ties keep the chain's order, like the sorted() this replaces
+        order = np.lexsort((candidates, -key))
+        return candidates[order]
+
+    def build_option(self, index, buying_power):
+        """Score one option into a fresh record, computed exactly as the values shown in the UI."""
+        if self._records is None:
+            # Only the displayed rows are made into records until the table needs all of them
+            option = OptionRecord(*self._values[index])
+        else:
+            option = self._records[index].copy()
+        option.underlying_price = self.underlying_price
+        option.delta = float(self.delta[index])
+        score_option(option, buying_power)
+        option.put_call_ratio = self.put_call_ratio
+        return option
+
+    def top_options(self, max_delta, buying_power, sorting_method, limit=TOP_OPTIONS_PER_TICKER, above=None,
+                    dte_range=None):
+        values = self.sort_values(buying_power, sorting_method)
+        if values is not None:
+            options = []
+            for index in self.top_indices(max_delta, buying_power, sorting_method, limit, above, values, dte_range):
+                option = self.build_option(index, buying_power)
+                option.score = float(values[index])
+                options.append(option)
+            return options
+        # Keys without a column or score ("message", unknown methods) are ranked on the built records
+        options = [self.build_option(index, buying_power) for index in self.candidates(max_delta, dte_range)]
+        return sorted(options, key=option_sort_key(sorting_method), reverse=True)[:limit]
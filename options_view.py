@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from operator import attrgetter
+
+import urwid
+
+from option_record import OptionRecord
+
+# Number of formatted rows kept around for scrolling back and re-ranking
+RENDERED_ROWS_LIMIT = 200
+
+# Everything format_option may show; a row is re-rendered only when one of these changed
+_option_version = attrgetter(*OptionRecord.__slots__)
+
+
+class OptionWalker(urwid.ListWalker):
+    """ListWalker over the sorted options that formats a row only when the ListBox asks for it.
+
+    Only the rows scrolled into view are ever formatted, and the most recently shown ones are
+    kept in an LRU keyed by option symbol, so the cost of the list does not grow with the number
+    of options. A divider closes the list, as before.
+    """
+
+    def __init__(self, format_option, cache_size=RENDERED_ROWS_LIMIT):
+        self.format_option = format_option
+        self.cache_size = cache_size
+        self.options = []
+        self.focus = 0
+        self.divider = urwid.Divider('-')
+        # symbol -> (option, version, widget), least recently used first
+        self.rendered = OrderedDict()
+
+    def __len__(self):
+        return len(self.options) + 1
+
+    def __getitem__(self, position):
+        if position == len(self.options):
+            return self.divider
+        if not 0 <= position < len(self.options):
+            raise IndexError(position)
+        return self.row_widget(self.options[position])
+
+    def next_position(self, position):
+        if position >= len(self.options):
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse=False):
+        return range(len(self) - 1, -1, -1) if reverse else range(len(self))
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def set_options(self, options, focus):
+        self.options = options
+        self.focus = min(focus, len(options))
+        self._modified()
+
+    def row_widget(self, option):
+        cached = self.rendered.get(option.symbol)
+        if cached is not None:
+            self.rendered.move_to_end(option.symbol)
+            cached_option, version, widget = cached
+            if cached_option is option:
+                return widget
+            new_version = _option_version(option)
+            if new_version == version:
+                self.rendered[option.symbol] = (option, version, widget)
+                return widget
+        else:
+            new_version = _option_version(option)
+        widget = self.format_option(option)
+        self.rendered[option.symbol] = (option, new_version, widget)
+        if len(self.rendered) > self.cache_size:
+            self.rendered.popitem(last=False)
+        return widget
+
+
+class OptionsView(urwid.WidgetWrap):
+    """The scrollable list of option rows, updated in place as the ranked options change.
+
+    Rows are keyed by option symbol; the focused row keeps its place on screen across updates.
+    """
+
+    def __init__(self, format_option):
+        self.keys = []
+        self.walker = OptionWalker(format_option)
+        self.listbox = urwid.ListBox(self.walker)
+        self.size = None
+        super().__init__(urwid.Pile([self.listbox]))
+
+    def render(self, size, focus=False):
+        self.size = size
+        return super().render(size, focus)
+
+    def update(self, options):
+        """Show options, in the given order. Rows are formatted once they scroll into view."""
+        focus_key = self.focus_key()
+        old_keys = self.keys
+        self.keys = [option.symbol for option in options]
+        focus = self.walker.focus
+        if focus_key is not None:
+            focus = self.focus_position(focus_key, old_keys)
+        self.walker.set_options(options, focus)
+
+    def focus_position(self, focus_key, old_keys):
+        """Position of the row that had focus, or of the nearest one of its old neighbours still shown."""
+        positions = {key: index for index, key in enumerate(self.keys)}
+        start = old_keys.index(focus_key)
+        for key in old_keys[start:] + old_keys[:start][::-1]:
+            if key in positions:
+                return positions[key]
+        return 0
+
+    def visible_options(self):
+        """The options of the rows on screen at the last render."""
+        if self.size is None or not self.walker.options:
+            return []
+        middle, top, bottom = self.listbox.calculate_visible(self.size)
+        if middle is None:
+            return []
+        positions = [middle[2]] + [position for _, position, _ in top[1] + bottom[1]]
+        return [self.walker.options[position] for position in sorted(positions)
+                if position < len(self.walker.options)]
+
+    def focus_key(self):
+        index = self.walker.focus
+        return self.keys[index] if index < len(self.keys) else None
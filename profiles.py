@@ -0,0 +1,91 @@
+"""Named scan profiles of the user config, all ranked from one shared chain fetch.
+
+    "profiles": {"conservative": {"max_delta": 0.15, "dte_range_min": 30}, "weekly": {"dte_range_max": 10}}
+
+The top-level settings form the "main" profile; a named profile overrides any of them. Chains are
+fetched once for the union of the profiles' DTE windows and each profile only ranks the
+expirations within its own window.
+"""
+from datetime import datetime, timedelta
+
+from config_setup import validate_max_delta, validate_dte_range_min, validate_dte_range_max, validate_buying_power
+from scoring import is_sorting_method
+
+MAIN_PROFILE = "main"
+# Setting -> type, for values typed into the configuration dialog
+PROFILE_SETTINGS = {"max_delta": float, "dte_range_min": int, "dte_range_max": int, "buying_power": float,
+                    "default_sorting_method": str}
+
+
+def profile_names(user_config):
+    """The main profile and the named ones whose settings can be used, see settings_error."""
+    return [MAIN_PROFILE] + [name for name in user_config.get("profiles", {})
+                             if name != MAIN_PROFILE and settings_error(profile_settings(user_config, name)) is None]
+
+
+def settings_error(settings):
+    """Why these profile settings cannot be used, or None."""
+    missing = [key for key in PROFILE_SETTINGS if key not in settings]
+    if missing:
+        return f"Missing settings {', '.join(missing)}."
+    try:
+        for is_valid, error_message in (validate_max_delta(settings["max_delta"]),
+                                        validate_dte_range_min(settings["dte_range_min"]),
+                                        validate_dte_range_max(settings["dte_range_min"], settings["dte_range_max"]),
+                                        validate_buying_power(settings["buying_power"])):
+            if not is_valid:
+                return error_message
+    except (TypeError, ValueError):
+        return "Delta range, DTE range, and buying power must be numbers."
+    return None
+
+
+def profile_errors(user_config):
+    """{name: error message} of the named profiles that are left out or sort by an unknown method.
+
+    A profile with an unknown sorting method is still shown, sorted by "arr" instead.
+    """
+    errors = {}
+    for name in user_config.get("profiles", {}):
+        settings = profile_settings(user_config, name)
+        error = settings_error(settings)
+        if error is None and not is_sorting_method(settings["default_sorting_method"]):
+            error = f"Unknown sorting method {settings['default_sorting_method']}."
+        if error is not None:
+            errors[name] = error
+    return errors
+
+
+def profile_settings(user_config, name=MAIN_PROFILE):
+    """The settings of a profile: the top-level ones with the profile's overrides applied."""
+    settings = {key: user_config[key] for key in PROFILE_SETTINGS if key in user_config}
+    if name != MAIN_PROFILE:
+        overrides = user_config.get("profiles", {}).get(name, {})
+        settings.update((key, value) for key, value in overrides.items() if key in PROFILE_SETTINGS)
+    return settings
+
+
+def set_profile_setting(user_config, name, key, value):
+    value = PROFILE_SETTINGS[key](value)
+    if name == MAIN_PROFILE:
+        user_config[key] = value
+    else:
+        user_config.setdefault("profiles", {}).setdefault(name, {})[key] = value
+
+
+def dte_range(settings):
+    return int(settings["dte_range_min"]), int(settings["dte_range_max"])
+
+
+def fetch_window(user_config, now=None):
+    """(from_date, to_date) covering the DTE windows of all profiles."""
+    now = now or datetime.now()
+    ranges = [dte_range(profile_settings(user_config, name)) for name in profile_names(user_config)]
+    return now + timedelta(days=min(low for low, _ in ranges)), now + timedelta(days=max(high for _, high in ranges))
+
+
+def ranking_dte_range(user_config, name):
+    """The DTE window a profile ranks on, or None when the fetched chains hold nothing else."""
+    if len(profile_names(user_config)) == 1:
+        return None
+    return dte_range(profile_settings(user_config, name))
@@ -0,0 +1,201 @@
+"""Level-one quotes over the TD Ameritrade streamer websocket.
+
+Only the options on screen and their underlyings are subscribed, so rows can be updated as
+quotes arrive while full chains are rescanned much less often. Requires the aiohttp package.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+import aiohttp
+
+import http_client
+import metrics
+
+# Quotes are merged per symbol and handed over at most this often, to keep redraws cheap
+DEFAULT_BATCH_SECS = 0.25
+# Streamer subscriptions are limited; nobody has more rows than this on screen anyway
+DEFAULT_MAX_SYMBOLS = 100
+HEARTBEAT_SECS = 30
+
+OPTION_SERVICE = "LEVELONE_OPTIONS"
+QUOTE_SERVICE = "QUOTE"
+# Streamer field number -> OptionRecord attribute
+OPTION_FIELDS = {2: "bid", 3: "ask", 8: "total_volume", 9: "open_interest", 10: "volatility", 20: "bid_size",
+                 21: "ask_size", 32: "delta"}
+# Last price of the underlying
+QUOTE_LAST_FIELD = 3
+
+
+def option_values(content):
+    """{attribute: value} of the option fields present in a LEVELONE_OPTIONS update."""
+    return {name: content[str(number)] for number, name in OPTION_FIELDS.items() if str(number) in content}
+
+
+class QuoteStream:
+    """Streamer connection running its own event loop in a daemon thread.
+
+    on_quotes(option_quotes, underlying_prices) is called from the stream thread with
+    {symbol: {attribute: value}} and {ticker: last price}. The connection is re-established with
+    backoff when it drops, and the current subscription is sent again.
+    """
+
+    def __init__(self, url, on_quotes, login=None, account=None, source=None, batch_secs=DEFAULT_BATCH_SECS,
+                 max_symbols=DEFAULT_MAX_SYMBOLS):
+        self.url = url
+        self.on_quotes = on_quotes
+        self.login = login
+        self.account = account
+        self.source = source
+        self.batch_secs = batch_secs
+        self.max_symbols = max_symbols
+        self._lock = threading.Lock()
+        self._symbols = {OPTION_SERVICE: (), QUOTE_SERVICE: ()}
+        self._sent = {}
+        self._request_id = 0
+        self._option_quotes = {}
+        self._underlying_prices = {}
+        self._loop = None
+        self._task = None
+        self._ws = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="quote-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            loop, task = self._loop, self._task
+        if loop is not None and task is not None:
+            loop.call_soon_threadsafe(task.cancel)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def subscribe(self, option_symbols, tickers):
+        """Stream these options and underlyings instead of the previous ones. Safe to call from any thread."""
+        symbols = {OPTION_SERVICE: tuple(sorted(set(option_symbols)))[:self.max_symbols],
+                   QUOTE_SERVICE: tuple(sorted(set(tickers)))}
+        with self._lock:
+            if symbols == self._symbols:
+                return
+            self._symbols = symbols
+            loop = self._loop
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._send_subscriptions(), loop)
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            task = loop.create_task(self._connect_forever())
+            with self._lock:
+                self._loop, self._task = loop, task
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            with self._lock:
+                self._loop = self._task = None
+            loop.close()
+
+    async def _connect_forever(self):
+        attempt = 0
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.url, heartbeat=HEARTBEAT_SECS) as ws:
+                        attempt = 0
+                        await self._stream(ws)
+                logging.warning("Quote stream closed by the server")
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, ValueError) as e:
+                logging.warning(f"Quote stream failed: {e}")
+            delay = http_client.compute_backoff(attempt)
+            metrics.count("stream_reconnects")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _stream(self, ws):
+        self._ws = ws
+        self._sent = {}
+        flusher = asyncio.ensure_future(self._flush_periodically())
+        try:
+            if self.login is not None:
+                await self._send(ws, "ADMIN", "LOGIN", self.login)
+            await self._send_subscriptions()
+            async for message in ws:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    self._handle(json.loads(message.data))
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    raise aiohttp.ClientError(ws.exception())
+        finally:
+            self._ws = None
+            flusher.cancel()
+
+    async def _send(self, ws, service, command, parameters):
+        self._request_id += 1
+        await ws.send_str(json.dumps({"requests": [{
+            "service": service, "command": command, "requestid": str(self._request_id),
+            "account": self.account, "source": self.source, "parameters": parameters}]}))
+
+    async def _send_subscriptions(self):
+        """Runs on the stream loop; SUBS replaces whatever a service was subscribed to before."""
+        ws = self._ws
+        if ws is None or ws.closed:
+            return
+        with self._lock:
+            symbols = dict(self._symbols)
+        for service, keys in symbols.items():
+            if self._sent.get(service, ()) == keys:
+                continue
+            if keys:
+                fields = "0," + ",".join(str(number) for number in OPTION_FIELDS) if service == OPTION_SERVICE \
+                    else f"0,{QUOTE_LAST_FIELD}"
+                await self._send(ws, service, "SUBS", {"keys": ",".join(keys), "fields": fields})
+            elif self._sent.get(service):
+                await self._send(ws, service, "UNSUBS", {"keys": ",".join(self._sent[service])})
+            self._sent[service] = keys
+
+    def _handle(self, message):
+        for response in message.get("response", []):
+            code = response.get("content", {}).get("code", 0)
+            if code != 0:
+                logging.error(f"Quote stream {response.get('service')} {response.get('command')} failed: "
+                              f"{response.get('content', {}).get('msg')}")
+        for data in message.get("data", []):
+            service = data.get("service")
+            for content in data.get("content", []):
+                key = content.get("key")
+                if key is None:
+                    continue
+                if service == OPTION_SERVICE:
+                    values = option_values(content)
+                    if values:
+                        self._option_quotes.setdefault(key, {}).update(values)
+                elif service == QUOTE_SERVICE and str(QUOTE_LAST_FIELD) in content:
+                    self._underlying_prices[key] = content[str(QUOTE_LAST_FIELD)]
+                metrics.count("stream_quotes")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.batch_secs)
+            if not self._option_quotes and not self._underlying_prices:
+                continue
+            option_quotes, self._option_quotes = self._option_quotes, {}
+            underlying_prices, self._underlying_prices = self._underlying_prices, {}
+            try:
+                self.on_quotes(option_quotes, underlying_prices)
+            except Exception:
+                logging.exception("Unable to apply streamed quotes.")
+
+
+def create_quote_stream(system_config, on_quotes):
+    """A started QuoteStream for the "streaming" section of the system config, or None without one."""
+    settings = system_config.get("streaming", {}) if system_config else {}
+    if not settings.get("url"):
+        return None
+    return QuoteStream(settings["url"], on_quotes, login=settings.get("login"), account=settings.get("account"),
+                       source=settings.get("source"),
+                       batch_secs=float(settings.get("batch_ms", DEFAULT_BATCH_SECS * 1000)) / 1000,
+                       max_symbols=int(settings.get("max_symbols", DEFAULT_MAX_SYMBOLS))).start()
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import threading
+import time
+
+# Published quotas: TD Ameritrade allows 120 requests/min per key, Finnhub's free tier 60/min
+DEFAULT_RATE_LIMITS = {
+    "tdameritrade": {"requests_per_minute": 120, "burst": 5},
+    "finnhub": {"requests_per_minute": 60, "burst": 5},
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers reserve a token and sleep until it is due."""
+
+    def __init__(self, requests_per_minute, burst):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        # Tokens may go negative: every caller gets its own slot in the queue, so
+        # concurrent workers are spread evenly over time instead of racing.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available; returns the seconds spent waiting."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens=1):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _provider_limits(overrides):
+    for provider in set(DEFAULT_RATE_LIMITS) | set(overrides):
+        limits = dict(DEFAULT_RATE_LIMITS.get(provider, {}))
+        limits.update(overrides.get(provider, {}))
+        yield provider, limits
+
+
+def _bucket(limits):
+    requests_per_minute = float(limits["requests_per_minute"])
+    burst = int(limits.get("burst", 1))
+    if requests_per_minute <= 0 or burst < 1:
+        raise ValueError("requests_per_minute must be above 0 and burst at least 1")
+    return TokenBucket(requests_per_minute, burst)
+
+
+def _build_limiters(overrides):
+    limiters = {}
+    for provider, limits in _provider_limits(overrides):
+        try:
+            limiters[provider] = _bucket(limits)
+        except (KeyError, TypeError, ValueError):
+            # Keep to the published quota rather than going unthrottled
+            default = DEFAULT_RATE_LIMITS.get(provider)
+            logging.error(f"Invalid rate limit settings for {provider}: {limits}"
+                          + (f", using {default}" if default else ""))
+            if default:
+                limiters[provider] = _bucket(default)
+    return limiters
+
+
+def configure_rate_limits(system_config):
+    """(Re)build the per-provider buckets from the "rate_limits" section of the system config."""
+    overrides = system_config.get("rate_limits", {}) if system_config else {}
+    limiters = _build_limiters(overrides)
+    with _limiters_lock:
+        _limiters.clear()
+        _limiters.update(limiters)
+
+
+def rate_limit_shares(system_config, shares):
+    """A "rate_limits" section that gives each of shares processes an equal part of every quota."""
+    overrides = system_config.get("rate_limits", {}) if system_config else {}
+    return {provider: {"requests_per_minute": float(limits["requests_per_minute"]) / shares,
+                       "burst": max(1, int(limits.get("burst", 1)) // shares)}
+            for provider, limits in _provider_limits(overrides)}
+
+
+def get_limiter(provider):
+    """Return the bucket for a provider, or None when it is not rate limited."""
+    if provider is None:
+        return None
+    with _limiters_lock:
+        if not _limiters:
+            _limiters.update(_build_limiters({}))
+        return _limiters.get(provider)
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+# Tickers that are not hot are refreshed this many times less often
+DEFAULT_COLD_MULTIPLIER = 10
+# While the market is closed nothing moves, so everything is refreshed this rarely
+DEFAULT_CLOSED_REFRESH_HOURS = 4
+# A candidate whose delta is within this fraction of max_delta may cross the filter any moment
+DEFAULT_NEAR_BOUNDARY = 0.85
+DEFAULT_HIGH_IV = 60.0
+DEFAULT_HIGH_VOLUME = 1000
+# Tickers with an option this high up the ranked list are kept hot
+DEFAULT_TOP_RANKS = 10
+
+
+class RefreshScheduler:
+    """Picks the tickers a periodic refresh has to fetch, from the age and content of their chains.
+
+    Hot tickers are refetched every refresh interval: those with a candidate near the delta or
+    buying power limits, with high IV or volume, or near the top of the list. The others are
+    refetched cold_multiplier times less often, and while the market is closed every ticker waits
+    closed_refresh_hours. Tickers without a chain are always due.
+    """
+
+    def __init__(self, refresh_interval, settings=None):
+        settings = settings or {}
+        self.refresh_interval = refresh_interval
+        self.cold_multiplier = float(settings.get("cold_multiplier", DEFAULT_COLD_MULTIPLIER))
+        self.closed_refresh_secs = float(settings.get("closed_refresh_hours", DEFAULT_CLOSED_REFRESH_HOURS)) * 3600
+        self.near_boundary = float(settings.get("near_boundary", DEFAULT_NEAR_BOUNDARY))
+        self.high_iv = float(settings.get("high_iv", DEFAULT_HIGH_IV))
+        self.high_volume = int(settings.get("high_volume", DEFAULT_HIGH_VOLUME))
+        self.top_ranks = int(settings.get("top_ranks", DEFAULT_TOP_RANKS))
+
+    def hot_tickers(self, options, max_delta):
+        """Tickers of the ranked options that need the full refresh rate."""
+        hot = {option.ticker for option in options[:self.top_ranks]}
+        for option in options:
+            if (option.delta >= max_delta * self.near_boundary
+                    or option.no_of_contracts_to_write <= 1
+                    or (option.volatility or 0) >= self.high_iv
+                    or (option.total_volume or 0) >= self.high_volume):
+                hot.add(option.ticker)
+        return hot
+
+    def max_age(self, ticker, hot, market_open):
+        if not market_open:
+            return self.closed_refresh_secs
+        if ticker in hot:
+            return self.refresh_interval
+        return self.refresh_interval * self.cold_multiplier
+
+    def longest_max_age(self, market_open):
+        """The age up to which any chain may be kept, that of a cold ticker."""
+        return self.max_age(None, set(), market_open)
+
+    def due_tickers(self, tickers, chains, hot, market_open, now=None):
+        """The (ticker, line_number) pairs whose chain is missing or older than its max age.
+
+        hot is the set of hot_tickers, of every ranking the chains are shown in.
+        """
+        now = now or datetime.now()
+        due = []
+        for ticker, line_number in tickers:
+            chain = chains.get(ticker)
+            if chain is None:
+                due.append((ticker, line_number))
+                continue
+            age = (now - chain["fetched_at"]).total_seconds()
+            # Refreshes only run every refresh_interval, so a chain due before the next one is due now
+            if age + self.refresh_interval / 2 >= self.max_age(ticker, hot, market_open):
+                due.append((ticker, line_number))
+        return due
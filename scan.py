@@ -0,0 +1,302 @@
+"""Headless scan: fetch and rank options for a watchlist and write them out, without the terminal UI.
+
+    python scan.py --watchlist tickers2watch.txt --format ndjson --output results.ndjson
+    python main.py scan --symbols SPY,QQQ --max-delta 0.25 --format csv
+
+Options are written per ticker as soon as its chain is fetched (best first within the ticker),
+or as one global ranking with --sorted. With --processes the watchlist is sharded across worker
+processes, each with its own connection pool and share of the rate limits.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+from api_fixtures import configure_recording
+from chain_store import configure_chain_store
+from config_setup import SYSTEM_CONFIG_PATH, USER_CONFIG_PATH
+from data_fetch import configure_base_urls, configure_ranking, fetch_chains, options_from_chain, ranking_limit, \
+    unique_tickers
+from earnings_cache import configure_earnings_cache
+from metrics import configure_metrics
+from option_record import OptionRecord
+from profiles import MAIN_PROFILE, profile_settings, settings_error
+from rate_limiter import configure_rate_limits
+from scoring import SORTING_METHODS, configure_scores, is_sorting_method
+from single_flight import configure_coalescing
+from sharded_scan import scan_sharded
+from top_options import TopOptions
+
+EXIT_OK = 0
+# Nothing could be fetched, or the scan failed
+EXIT_ERROR = 1
+# Bad arguments or configuration
+EXIT_USAGE = 2
+# Some tickers could not be fetched; the others were written
+EXIT_PARTIAL = 3
+
+FORMATS = ("ndjson", "csv", "arrow")
+USER_SETTINGS = ("max_delta", "dte_range_min", "dte_range_max", "buying_power", "default_sorting_method")
+
+# Arrow column types of the OptionRecord fields
+ARROW_TYPES = {
+    "symbol": "string", "description": "string", "bid": "float64", "ask": "float64", "bid_size": "int64",
+    "ask_size": "int64", "delta": "float64", "volatility": "float64", "total_volume": "int64",
+    "open_interest": "int64", "strike_price": "float64", "days_to_expiration": "int64",
+    "underlying_price": "float64", "put_call_ratio": "float64", "no_of_contracts_to_write": "int64",
+    "premium_usd": "float64", "premium_per_day": "float64", "arr": "float64", "score": "float64",
+    "message": "string",
+    "ticker": "string", "line_number": "int64", "has_earnings": "bool_", "earnings_data_retrieved": "bool_",
+}
+
+
+class ScanError(Exception):
+    """A problem with the arguments or configuration of a scan."""
+
+
+class NdjsonWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, options):
+        for option in options:
+            self.stream.write(json.dumps(option.as_dict()) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class CsvWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames=OptionRecord.__slots__)
+        self.writer.writeheader()
+
+    def write(self, options):
+        self.writer.writerows(option.as_dict() for option in options)
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class ArrowWriter:
+    """Writes an Arrow IPC stream, one record batch per write."""
+
+    def __init__(self, stream):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ScanError("The arrow format requires the pyarrow package.")
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(field, getattr(pyarrow, ARROW_TYPES[field])())
+                                      for field in OptionRecord.__slots__])
+        self.writer = pyarrow.ipc.new_stream(stream, self.schema)
+
+    def write(self, options):
+        if options:
+            self.writer.write_batch(self.pyarrow.RecordBatch.from_pylist(
+                [option.as_dict() for option in options], schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"ndjson": NdjsonWriter, "csv": CsvWriter, "arrow": ArrowWriter}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="scan", description="Scan a watchlist for put options to sell.")
+    parser.add_argument("--system-config", default=SYSTEM_CONFIG_PATH, help="system config file")
+    parser.add_argument("--user-config", default=USER_CONFIG_PATH, help="user config file (optional)")
+    parser.add_argument("--watchlist", default="./tickers2watch.txt", help="file with one ticker per line")
+    parser.add_argument("--symbols", help="comma separated tickers, instead of the watchlist")
+    parser.add_argument("--max-delta", type=float)
+    parser.add_argument("--dte-min", type=int, dest="dte_range_min")
+    parser.add_argument("--dte-max", type=int, dest="dte_range_max")
+    parser.add_argument("--buying-power", type=float)
+    parser.add_argument("--profile", help="scan with the settings of this profile of the user config")
+    parser.add_argument("--sort", dest="default_sorting_method",
+                        help=f"{', '.join(SORTING_METHODS)} or a score from the user config")
+    parser.add_argument("--api-key", help="TD Ameritrade API key, overrides the system config")
+    parser.add_argument("--finnhub-api-key", help="Finnhub API key, overrides the system config")
+    parser.add_argument("--backend", choices=("threads", "asyncio"), help="overrides fetch_backend")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("-o", "--output", default="-", help="output file, - for stdout (default)")
+    parser.add_argument("--sorted", action="store_true",
+                        help="write one ranking across all tickers once the scan is done")
+    parser.add_argument("--limit", type=int,
+                        help="only write the top LIMIT options of the ranking (with --sorted or --processes)")
+    parser.add_argument("--save-snapshots", action="store_true",
+                        help="save the fetched chains as the snapshots the app starts from")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="write the scan's metrics to this file, in the metrics format of the system config")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="split the tickers across this many worker processes (implies --sorted)")
+    return parser.parse_args(argv)
+
+
+def load_json(path, required):
+    # Unlike config_setup, never prompts: a scan has to run unattended
+    if not os.path.exists(path):
+        if required:
+            raise ScanError(f"Config file not found: {path}")
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (IOError, ValueError) as e:
+        raise ScanError(f"Unable to read config file {path}: {e}")
+
+
+def load_settings(args):
+    """The system config and the user settings, with the command line overrides applied."""
+    system_config = load_json(args.system_config, required=True)
+    for key, value in (("api_key", args.api_key), ("finnhub_api_key", args.finnhub_api_key),
+                       ("fetch_backend", args.backend)):
+        if value is not None:
+            system_config[key] = value
+    if not args.save_snapshots:
+        # Scans often use other DTE windows than the app, whose snapshots they would replace
+        system_config["chain_store"] = {"path": ""}
+    # Only a scan given --metrics writes a metrics file, the app's metrics.jsonl is left alone
+    system_config["metrics"] = dict(system_config.get("metrics", {}), path=args.metrics or "")
+    for key in ("api_key", "finnhub_api_key"):
+        if not system_config.get(key):
+            raise ScanError(f"Missing {key} in {args.system_config}")
+
+    user_config = load_json(args.user_config, required=False)
+    if args.profile is not None:
+        names = [MAIN_PROFILE] + list(user_config.get("profiles", {}))
+        if args.profile not in names:
+            raise ScanError(f"Unknown profile {args.profile}: use one of {', '.join(names)}")
+        user_config.update(profile_settings(user_config, args.profile))
+    for key in USER_SETTINGS:
+        if getattr(args, key) is not None:
+            user_config[key] = getattr(args, key)
+    missing = [key for key in USER_SETTINGS if key not in user_config]
+    if missing:
+        raise ScanError(f"Missing settings {', '.join(missing)}: add them to {args.user_config} "
+                        f"or pass them as options")
+    error = settings_error(user_config)
+    if error is not None:
+        raise ScanError(f"Invalid settings: {error}")
+    configure_scores(user_config)
+    sorting_method = user_config["default_sorting_method"]
+    if not is_sorting_method(sorting_method):
+        raise ScanError(f"Unknown sorting method {sorting_method}: use one of {', '.join(SORTING_METHODS)} "
+                        f"or a valid score from {args.user_config}")
+    return system_config, user_config
+
+
+def load_tickers(args):
+    if args.symbols:
+        symbols = [symbol.strip().upper() for symbol in args.symbols.split(",") if symbol.strip()]
+    else:
+        try:
+            with open(args.watchlist, "r") as f:
+                symbols = f.read().splitlines()
+        except IOError as e:
+            raise ScanError(f"Unable to read watchlist {args.watchlist}: {e}")
+    tickers = unique_tickers([(symbol, line_number) for line_number, symbol in enumerate(symbols, start=1)])
+    if not tickers:
+        raise ScanError("No tickers to scan.")
+    return tickers
+
+
+def open_output(path, output_format):
+    binary = output_format == "arrow"
+    if path == "-":
+        return sys.stdout.buffer if binary else sys.stdout
+    return open(path, "wb" if binary else "w", newline=None if binary else "")
+
+
+def run_scan(args):
+    """Run the scan described by args and return its exit code."""
+    system_config, user_config = load_settings(args)
+    tickers = load_tickers(args)
+    if args.processes < 1:
+        raise ScanError("--processes must be at least 1.")
+    if args.limit is not None:
+        if args.limit < 1:
+            raise ScanError("--limit must be at least 1.")
+        if not args.sorted and args.processes == 1:
+            # Streamed options are written before the ranking they would be cut from is known
+            raise ScanError("--limit needs --sorted or --processes.")
+    configure_base_urls(system_config)
+    configure_recording(system_config)
+    configure_rate_limits(system_config)
+    configure_earnings_cache(system_config)
+    configure_chain_store(system_config)
+    configure_metrics(system_config)
+    configure_ranking(system_config)
+    configure_coalescing(system_config)
+
+    max_delta = float(user_config["max_delta"])
+    buying_power = float(user_config["buying_power"])
+    sorting_method = user_config["default_sorting_method"]
+    from_date = datetime.now() + timedelta(days=int(user_config["dte_range_min"]))
+    to_date = datetime.now() + timedelta(days=int(user_config["dte_range_max"]))
+
+    stream = open_output(args.output, args.format)
+    try:
+        writer = WRITERS[args.format](stream)
+        failed = []
+        # Only the options that can still make the final ranking are kept while the scan runs
+        ranked = TopOptions(sorting_method, ranking_limit(args.limit))
+
+        def chain_callback(ticker, chain):
+            if chain is None:
+                failed.append(ticker)
+                return
+            options = options_from_chain(chain, max_delta, buying_power, sorting_method,
+                                         *((args.limit, ranked.threshold()) if args.sorted else ()))
+            if args.sorted:
+                ranked.add(options)
+            else:
+                writer.write(options)
+
+        if args.processes > 1:
+            options, failed = scan_sharded(system_config, tickers, from_date, to_date, max_delta, buying_power,
+                                           sorting_method, args.processes, args.limit, user_config.get("scores"))
+            writer.write(options)
+        else:
+            fetch_chains(system_config["api_key"], tickers, from_date, to_date, system_config["finnhub_api_key"],
+                         backend=system_config.get("fetch_backend", "threads"), chain_callback=chain_callback)
+            if args.sorted:
+                writer.write(ranked.ranked())
+        writer.close()
+    finally:
+        if stream not in (sys.stdout, sys.stdout.buffer):
+            stream.close()
+
+    if failed:
+        logging.warning(f"Unable to fetch {len(failed)} of {len(tickers)} tickers: {', '.join(sorted(failed))}")
+        return EXIT_ERROR if len(failed) == len(tickers) else EXIT_PARTIAL
+    return EXIT_OK
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Diagnostics go to stderr, stdout may carry the results
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    try:
+        return run_scan(args)
+    except ScanError as e:
+        logging.error(str(e))
+        return EXIT_USAGE
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); keep Python from failing to flush stdout on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_ERROR
+    except Exception as e:
+        logging.exception(f"Scan failed: {e}")
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
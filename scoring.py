@@ -0,0 +1,117 @@
+"""Composite scores: weighted sums of option factors, defined in the "scores" section of the user config.
+
+    "scores": {"balanced": {"arr": 1.0, "spread": -0.5, "liquidity": 2.0, "distance": 0.3}}
+
+A score is compiled once into a function over the columns of an OptionTable, so ranking by it
+runs vectorized like the built-in sorting methods, and any score name can be used as one.
+"""
+import logging
+import threading
+
+import numpy as np
+
+from option_record import OptionRecord
+
+
+def spread(table, columns):
+    # Bid/ask spread in percent of the ask, as shown in the UI; no ask counts as the worst spread
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(table.ask > 0, (table.ask - table.bid) / table.ask * 100, 100.0)
+
+
+def liquidity(table, columns):
+    # Order of magnitude of the contracts quoted on both sides
+    return np.log10(1 + np.nan_to_num(table.bid_size) + np.nan_to_num(table.ask_size))
+
+
+def put_call_ratio(table, columns):
+    return np.full(len(table), float(table.put_call_ratio or 0.0))
+
+
+def iv(table, columns):
+    return np.nan_to_num(table.volatility)
+
+
+def distance(table, columns):
+    # How far the strike is below the underlying, in percent
+    if not table.underlying_price:
+        return np.zeros(len(table))
+    return (table.underlying_price - table.strike) / table.underlying_price * 100
+
+
+def column(name):
+    return lambda table, columns: columns[name]
+
+
+# Factor name -> function(table, score columns) returning one value per option
+FACTORS = {
+    "arr": column("arr"),
+    "premium_usd": column("premium_usd"),
+    "premium_per_day": column("premium_per_day"),
+    "delta": column("delta"),
+    "spread": spread,
+    "liquidity": liquidity,
+    "put_call_ratio": put_call_ratio,
+    "iv": iv,
+    "distance": distance,
+}
+
+
+def compile_score(weights):
+    """A function(table, score columns) -> score array for {factor: weight}; ValueError for bad weights."""
+    if not isinstance(weights, dict) or not weights:
+        raise ValueError("a score needs at least one factor weight")
+    terms = []
+    for factor, weight in weights.items():
+        if factor not in FACTORS:
+            raise ValueError(f"unknown factor {factor}, use one of {', '.join(FACTORS)}")
+        terms.append((FACTORS[factor], float(weight)))
+
+    def score(table, columns):
+        total = np.zeros(len(table))
+        for factor, weight in terms:
+            total += weight * factor(table, columns)
+        # Options missing a value rank last instead of breaking the sort
+        return np.where(np.isnan(total), -np.inf, total)
+
+    return score
+
+
+# Sorting methods with a column in the option table; the names of valid scores can be used as well
+SORTING_METHODS = ("arr", "premium_usd", "premium_per_day", "delta")
+DEFAULT_SORTING_METHOD = "arr"
+
+_scores = {}
+_scores_lock = threading.Lock()
+
+
+def configure_scores(user_config):
+    """Compile the "scores" section of the user config; invalid scores are logged and left out."""
+    compiled = {}
+    for name, weights in (user_config.get("scores", {}) if user_config else {}).items():
+        if name in OptionRecord.__slots__:
+            # Rankings on the built records would sort by the field instead of the score
+            logging.error(f"Invalid score {name}: the name of an option field cannot be used")
+            continue
+        try:
+            compiled[name] = compile_score(weights)
+        except (TypeError, ValueError) as e:
+            logging.error(f"Invalid score {name}: {e}")
+    with _scores_lock:
+        _scores.clear()
+        _scores.update(compiled)
+
+
+def get_score(name):
+    """The compiled score of that name, or None."""
+    with _scores_lock:
+        return _scores.get(name)
+
+
+def score_names():
+    with _scores_lock:
+        return list(_scores)
+
+
+def is_sorting_method(name):
+    return name in SORTING_METHODS or get_score(name) is not None
@@ -0,0 +1,84 @@
+import heapq
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from api_fixtures import configure_recording
+from chain_store import configure_chain_store
+from data_fetch import configure_base_urls, configure_ranking, fetch_chains, prefetch_earnings, rank_chains, \
+    ranking_limit, option_sort_key, unique_tickers
+from earnings_cache import configure_earnings_cache
+from rate_limiter import configure_rate_limits, rate_limit_shares
+from scoring import configure_scores
+from single_flight import configure_coalescing
+
+
+def shard_tickers(tickers, shards):
+    """Split the (ticker, line_number) pairs round-robin into at most shards non-empty lists."""
+    return [tickers[index::shards] for index in range(min(shards, len(tickers)))]
+
+
+def scan_shard(system_config, tickers, from_date, to_date, max_delta, buying_power, sorting_method, limit,
+               scores=None):
+    """Runs in a worker process: fetch and rank one shard.
+
+    Returns (options best first, tickers that failed). The worker has its own connection pool
+    and the share of the rate limits set in system_config.
+    """
+    configure_base_urls(system_config)
+    configure_recording(system_config)
+    configure_rate_limits(system_config)
+    configure_earnings_cache(system_config)
+    configure_chain_store(system_config)
+    configure_ranking(system_config)
+    configure_coalescing(system_config)
+    configure_scores({"scores": scores or {}})
+
+    failed = []
+
+    def chain_callback(ticker, chain):
+        if chain is None:
+            failed.append(ticker)
+
+    chains = fetch_chains(system_config["api_key"], tickers, from_date, to_date, system_config["finnhub_api_key"],
+                          backend=system_config.get("fetch_backend", "threads"), chain_callback=chain_callback)
+    return rank_chains(chains.values(), max_delta, buying_power, sorting_method, limit), failed
+
+
+def scan_sharded(system_config, tickers, from_date, to_date, max_delta, buying_power, sorting_method, processes,
+                 limit=None, scores=None):
+    """Scan the tickers in a pool of processes and merge the shards into one ranking.
+
+    Each shard is ranked (and cut to its top limit, or the configured top_n) in its worker; the shards
+    are then merged with a heap merge, as a global top limit can only come from the shards' top limits. Returns
+    (options best first, tickers that failed). scores is the "scores" section of the user config.
+    """
+    # Coalescing is per process, so a repeated ticker must not land in two shards
+    tickers = unique_tickers(tickers)
+    shards = shard_tickers(tickers, processes)
+    shard_config = dict(system_config, rate_limits=rate_limit_shares(system_config, len(shards)))
+
+    # Warm the shared earnings cache once, so the shards do not each query the market-wide calendar
+    prefetch_earnings(tickers, to_date, system_config["finnhub_api_key"])
+
+    results = []
+    failed = []
+    # Spawned workers start without the parent's sockets, caches or threads
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(scan_shard, shard_config, shard, from_date, to_date, max_delta, buying_power,
+                                   sorting_method, limit, scores)
+                   for shard in shards]
+        for shard, future in zip(shards, futures):
+            try:
+                options, shard_failed = future.result()
+            except Exception:
+                logging.exception(f"Scan shard of {len(shard)} tickers failed.")
+                failed.extend(ticker for ticker, _ in shard)
+                continue
+            results.append(options)
+            failed.extend(shard_failed)
+
+    merged = heapq.merge(*results, key=option_sort_key(sorting_method), reverse=True)
+    limit = ranking_limit(limit)
+    return list(islice(merged, limit) if limit is not None else merged), failed
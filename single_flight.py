@@ -0,0 +1,123 @@
+"""Coalescing of identical fetches that overlap in time.
+
+A forced refresh, a re-sort that finds the chains stale, a config change and the refresh alarm can
+all ask for the same chains at about the same time. The first request for a key runs the fetch;
+requests made while it is in flight, or up to reuse_secs after it succeeded, share its result
+instead of calling the API again. Works across threads and event loops, as the flights are
+concurrent.futures.Future objects.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+# Successful results are shared with requests made this long after they arrived
+DEFAULT_REUSE_SECS = 2.0
+
+
+class FlightAbandoned(Exception):
+    """The fetch a request was waiting on was cancelled; the request runs its own fetch instead."""
+
+
+class SingleFlight:
+    def __init__(self, reuse_secs=DEFAULT_REUSE_SECS):
+        self.reuse_secs = reuse_secs
+        self._lock = threading.Lock()
+        # key -> (future, monotonic time the result arrived or None while in flight)
+        self._flights = {}
+        self._pruned_at = time.monotonic()
+
+    def claim(self, key):
+        """(future, owner): the owner has to run the fetch and finish() or abandon() the future."""
+        now = time.monotonic()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                future, finished_at = flight
+                if finished_at is None or now - finished_at <= self.reuse_secs:
+                    metrics.count("coalesced")
+                    return future, False
+            if now - self._pruned_at > self.reuse_secs:
+                self._prune(now)
+            future = Future()
+            # A running future cannot be cancelled by one of the requests waiting on it
+            future.set_running_or_notify_cancel()
+            self._flights[key] = (future, None)
+            return future, True
+
+    def finish(self, key, future, result=None, exception=None):
+        with self._lock:
+            if exception is None and result is not None and self.reuse_secs > 0:
+                self._flights[key] = (future, time.monotonic())
+            elif self._flights.get(key, (None,))[0] is future:
+                # Failures are not reused, the next request tries again
+                del self._flights[key]
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def abandon(self, key, future):
+        self.finish(key, future, exception=FlightAbandoned())
+
+    def _prune(self, now):
+        self._flights = {key: (future, finished_at) for key, (future, finished_at) in self._flights.items()
+                         if finished_at is None or now - finished_at <= self.reuse_secs}
+        self._pruned_at = now
+
+    def call(self, key, fetch):
+        """fetch(), or the result of the identical fetch already in flight."""
+        while True:
+            future, owner = self.claim(key)
+            if not owner:
+                try:
+                    return future.result()
+                except FlightAbandoned:
+                    continue
+            try:
+                result = fetch()
+            except Exception as e:
+                self.finish(key, future, exception=e)
+                raise
+            except BaseException:
+                self.abandon(key, future)
+                raise
+            self.finish(key, future, result)
+            return result
+
+    async def call_async(self, key, fetch):
+        """Coroutine counterpart of call, for a fetch() returning an awaitable."""
+        while True:
+            future, owner = self.claim(key)
+            if not owner:
+                try:
+                    return await asyncio.wrap_future(future)
+                except FlightAbandoned:
+                    continue
+            try:
+                result = await fetch()
+            except Exception as e:
+                self.finish(key, future, exception=e)
+                raise
+            except BaseException:
+                # Cancelled along with its refresh; whoever waits on it fetches for themselves
+                self.abandon(key, future)
+                raise
+            self.finish(key, future, result)
+            return result
+
+
+_single_flight = SingleFlight()
+
+
+def configure_coalescing(system_config):
+    """Apply the "coalescing" section of the system config, e.g. {"reuse_secs": 2}."""
+    global _single_flight
+    settings = system_config.get("coalescing", {}) if system_config else {}
+    _single_flight = SingleFlight(float(settings.get("reuse_secs", DEFAULT_REUSE_SECS)))
+
+
+def get_single_flight():
+    return _single_flight
@@ -0,0 +1,60 @@
+import heapq
+
+from option_record import OptionRecord
+
+
+def numeric_key(value):
+    # Missing values rank last, as they did with the dict records' .get(key, -1)
+    return -1.0 if value is None else float(value)
+
+
+def option_sort_key(sorting_method):
+    if sorting_method == "message":
+        return lambda option: option.message or ""
+    if sorting_method not in OptionRecord.__slots__:
+        # Composite scores are computed into the score field when the option is selected; with an
+        # unknown method (e.g. a score removed from the config) every key is -1 and the order is kept
+        return lambda option: numeric_key(option.score)
+    return lambda option: numeric_key(getattr(option, sorting_method))
+
+
+class TopOptions:
+    """The best options across tickers, collected as each ticker's results arrive.
+
+    With a limit only that many options are kept, in a min-heap whose root is the first to go,
+    so memory and sorting cost follow the size of the list shown rather than the number of
+    tickers. Every option's sort key is computed once, when it is added. Equal keys rank in the
+    order they were added, as with a stable sort.
+    """
+
+    def __init__(self, sorting_method, limit=None):
+        self.sort_key = option_sort_key(sorting_method)
+        self.limit = limit
+        # (key, -sequence, option); the latest of equal keys is the smallest, so it is dropped first
+        self._entries = []
+        self._added = 0
+
+    def add(self, options):
+        for option in options:
+            self._added += 1
+            entry = (self.sort_key(option), -self._added, option)
+            if self.limit is None:
+                self._entries.append(entry)
+            elif len(self._entries) < self.limit:
+                heapq.heappush(self._entries, entry)
+            elif self._entries and entry[:2] > self._entries[0][:2]:
+                heapq.heapreplace(self._entries, entry)
+        return self
+
+    def threshold(self):
+        """The key an option has to beat to be kept, or None while there is room for any."""
+        if self.limit is None or len(self._entries) < self.limit or not self._entries:
+            return None
+        return self._entries[0][0]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ranked(self):
+        """The options kept, best first."""
+        return [option for _, _, option in sorted(self._entries, key=lambda entry: entry[:2], reverse=True)]